@@ -41,6 +41,19 @@ char text[]="WELCOME";
 unsigned int i=0;
 int blink_flag=0;
 
+// Binary command frames: 0xA5, opcode, seq, length, payload, XOR checksum of opcode..payload
+// The host switches to them by sending "binary" and waiting for "BIN 1"
+#define FRAME_START 0xA5
+#define MAX_PAYLOAD 32
+#define OP_TEXT 0x20
+#define OP_SERVO 0x21
+#define OP_RAW 0x7F
+bool binaryMode=false;
+// Indexed by opcode, keep in sync with OPCODES in physical_engine.py
+const char* const opcode_names[]={"a","on","off","sine","happy","sad","angry","rotate1","rotate2",
+  "temph","camera","clock","game","exercise","logo","led_blink","motion_on","motion_off","idle",
+  "pir_init_silent","ping","#MusicWave","#MusicWave2","#MusicWave3"};
+
 void setup() 
 {  
    Servo1.attach(servoPin); //servo attachment to pin 9  
@@ -188,9 +201,67 @@ void get_dht()
   lcd.print("Humidity(%):");
   lcd.setCursor(12,1);
   lcd.print(h);
+  // Report the reading to the host as "DHT <temperature> <humidity>"
+  Serial.print("DHT ");
+  Serial.print(t);
+  Serial.print(" ");
+  Serial.println(h);
   delay(100); // wait two seconds
 }
 
+String read_binary_command()
+{
+  //reads one binary frame, acknowledges it and returns the equivalent text command
+  if(Serial.read()!=FRAME_START)
+  {
+    return "";   //not at a frame boundary, drop the byte and resync
+  }
+  byte header[3];
+  if(Serial.readBytes(header,3)!=3 || header[2]>MAX_PAYLOAD)
+  {
+    return "";
+  }
+  byte op=header[0];
+  byte len=header[2];
+  char payload[MAX_PAYLOAD+1];
+  byte check;
+  if(Serial.readBytes(payload,len)!=len || Serial.readBytes(&check,1)!=1)
+  {
+    return "";
+  }
+  byte sum=header[0]^header[1]^header[2];
+  for(int k=0;k<len;k++)
+  {
+    sum^=(byte)payload[k];
+  }
+  if(sum!=check)
+  {
+    Serial.println("NAK");
+    return "";
+  }
+  payload[len]='\0';
+  Serial.print("ACK ");
+  Serial.println(header[1]);
+
+  if(op==OP_TEXT)
+  {
+    return "#"+String(payload);
+  }
+  if(op==OP_SERVO && len==1)
+  {
+    return "@"+String((byte)payload[0]);
+  }
+  if(op==OP_RAW)
+  {
+    return String(payload);
+  }
+  if(op<sizeof(opcode_names)/sizeof(opcode_names[0]))
+  {
+    return opcode_names[op];
+  }
+  return "";
+}
+
 void processing()
 {
     lcd.write("Processing");
@@ -312,11 +383,32 @@ void loop()
     }
     
     //looks for the serial function input 
-    if (Serial.available()>0)
+    if (Serial.available()>0 && binaryMode)
+    {
+      emotion=read_binary_command();
+    }
+    else if (Serial.available()>0)
     {
       emotion=Serial.readStringUntil('\r');
       Serial.print("Received command: ");
       Serial.println(emotion);
+
+      // Framed commands from the host look like "!<seq> <command>"
+      // Acknowledge the sequence number and keep only the command
+      if(emotion.startsWith("!"))
+      {
+        int sep=emotion.indexOf(' ');
+        String seq=(sep>=0) ? emotion.substring(1,sep) : emotion.substring(1);
+        emotion=(sep>=0) ? emotion.substring(sep+1) : "";
+        Serial.print("ACK ");
+        Serial.println(seq);
+      }
+      if(emotion=="binary")
+      {
+        binaryMode=true;
+        Serial.println("BIN 1");
+        emotion="";
+      }
     } 
 
     //declaration of different function parameters
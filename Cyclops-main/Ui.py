@@ -1,7 +1,7 @@
 import customtkinter as ctk
 from tkinter import simpledialog, messagebox
 from brain import *  # Importing the existing brain.py functionalities
-from voice_engine import speak  # Import speak function to make Cyclops talk
+from voice_engine import speak, speak_async, stop_speaking, SentenceSpeaker  # Import speak functions to make Cyclops talk
 from scheduler_engine import add_schedule, check_schedule, schedule_remover, create_file
 from visual_engine import show_my_face, emotion_identity  # Import visual engine functions
 from music_engine import play_music, play_youtube_video  # Import music engine functions
@@ -12,6 +12,12 @@ import os
 import csv
 import random
 from news_engine import get_news_world
+from physical_engine import add_listener, wait_for_temperature
+from intent_engine import classify
+from retrieval_engine import index_note
+
+MOTION_GREETING_INTERVAL = 60  # Seconds between greetings when the PIR sensor keeps reporting motion
+
 # Set the appearance mode and color theme
 ctk.set_appearance_mode("System")
 ctk.set_default_color_theme("blue")
@@ -28,6 +34,7 @@ class CyclopsUI:
         self.emotion_detection_active = False
         # Initialize camera lock for thread safety
         self.camera_lock = threading.Lock()
+        self.last_motion_greeting = 0
         
         self.initialize_assistant()
         self.create_widgets()
@@ -154,7 +161,7 @@ class CyclopsUI:
             )
             button.grid(row=1, column=i, padx=6, pady=6)
 
-    def add_chat_bubble(self, text, is_user=True):
+    def add_chat_bubble(self, text, is_user=True, speak_text=True):
         bubble_frame = ctk.CTkFrame(
             self.chat_area,
             corner_radius=15,
@@ -174,8 +181,9 @@ class CyclopsUI:
 
         self.chat_area._parent_canvas.yview_moveto(1.0)
 
-        if not is_user:
-            threading.Thread(target=speak, args=(text.replace("Cyclops:", "").strip(),), daemon=True).start()
+        if not is_user and speak_text:
+            # Queued on the speech thread so overlapping bubbles are spoken in order
+            speak_async(text.replace("Cyclops:", "").strip())
 
     def process_command(self, event=None):
         command = self.input_textbox.get("1.0", ctk.END).strip().lower()
@@ -184,38 +192,35 @@ class CyclopsUI:
         if not command:
             return
 
+        # A new command makes anything still being said about the previous one stale
+        stop_speaking()
         self.add_chat_bubble(f"You: {command}", is_user=True)
         
         # Check for "Hey Cyclops, take photo" or similar commands
         if self.handle_direct_commands(command):
             return # Exit early after handling the photo command
 
+        # Routine commands worded differently are recognized locally before asking the LLM
+        if self.handle_intent(classify(command)):
+            return
+
         # Existing command processing
         try:
             send_data("Processing", LOOP_ARD)
         except Exception as e:
             print(f"Error sending motion command: {e}")
-        response, function, self.message = LLM_answer(command, self.message, self.llama_model)
+        # Speak the reply sentence by sentence while the LLM is still generating it
+        speaker = SentenceSpeaker()
+        # The bot's gesture for the function is sent as soon as the call has been generated.
+        # This runs on the Tk thread, so never wait for a model that is still loading.
+        response, function, self.message = LLM_answer(command, self.message, self.llama_model, speaker.feed,
+                                                      self.send_function_gesture, load_timeout=0)
 
-            
-      
-        self.add_chat_bubble(f"Cyclops: {response}", is_user=False)
+        # Canned answers are not streamed, so let the bubble speak those
+        self.add_chat_bubble(f"Cyclops: {response}", is_user=False, speak_text=speaker.finish() == 0)
 
         if function:
             try:
-                if "play_youtube" in function or "play_music" in function:
-                   send_data("thinking", LOOP_ARD)
-                elif "timer" in function:
-                    send_data("clock", LOOP_ARD)
-                    send_data("thinking", LOOP_ARD)
-                elif "schedule" in function:
-                    send_data("#Scheduler", LOOP_ARD)
-                    send_data("thinking", LOOP_ARD)
-                elif "show_image" in function:
-                    send_data("#" + response, LOOP_ARD)
-                else:
-                    send_data("thinking", LOOP_ARD)
-                    
                 llm_interpreter(function, response)
             except Exception as e:
                 print(f"Error during function execution: {e}")
@@ -223,6 +228,24 @@ class CyclopsUI:
                     send_data("idle", LOOP_ARD)
                 except:
                     pass
+
+    def send_function_gesture(self, function, response):
+        """Show the Arduino gesture for the function the LLM picked"""
+        try:
+            if "play_youtube" in function or "play_music" in function:
+               send_data("thinking", LOOP_ARD)
+            elif "timer" in function:
+                send_data("clock", LOOP_ARD)
+                send_data("thinking", LOOP_ARD)
+            elif "schedule" in function:
+                send_data("#Scheduler", LOOP_ARD)
+                send_data("thinking", LOOP_ARD)
+            elif "show_image" in function:
+                send_data("#" + response, LOOP_ARD)
+            else:
+                send_data("thinking", LOOP_ARD)
+        except Exception as e:
+            print(f"Error sending function gesture: {e}")
     def handle_direct_commands(self,command) :
         if any(phrase in command.lower() for phrase in ["hello cyclops", "hey cyclops"]):
             self.add_chat_bubble(f"Cyclops: Hello {self.user_name}! How can I help you today?", is_user=False)
@@ -298,18 +321,7 @@ class CyclopsUI:
                     break
             
             if genre:
-
-                self.add_chat_bubble(f"Cyclops: Playing {genre} music...", is_user=False)
-            # Send command to display sinewave on LCD
-                try:
-                    send_data("sine", LOOP_ARD)
-                    send_data(f"#Now Playing: {genre} music", LOOP_ARD)
-                except Exception as e:
-                    print(f"Error sending LCD command: {e}")
-                    
-                self.dancing = True
-                threading.Thread(target=self.dance_animation, args=(genre,), daemon=True).start()
-                play_music(genre)
+                self.play_genre(genre)
             else:
                 self.play_music()  # Will prompt for genre or song
             return True
@@ -391,6 +403,68 @@ class CyclopsUI:
         # No direct command matched
         return False
 
+    def play_genre(self, genre):
+        self.add_chat_bubble(f"Cyclops: Playing {genre} music...", is_user=False)
+        # Send command to display sinewave on LCD
+        try:
+            send_data("sine", LOOP_ARD)
+            send_data(f"#Now Playing: {genre} music", LOOP_ARD)
+        except Exception as e:
+            print(f"Error sending LCD command: {e}")
+
+        self.dancing = True
+        threading.Thread(target=self.dance_animation, args=(genre,), daemon=True).start()
+        play_music(genre)
+
+    def handle_intent(self, intent):
+        """Carry out a routine command recognized by the intent classifier; False if it needs the LLM"""
+        if intent is None:
+            return False
+        slots = intent.slots
+        now = datetime.datetime.now()
+
+        if intent.name == "time":
+            self.add_chat_bubble(f"Cyclops: Current time is {now.hour} hours {now.minute} minutes", is_user=False)
+        elif intent.name == "date":
+            self.add_chat_bubble(f"Cyclops: Current date is {now.day} of {MONTH_LIST[now.month - 1]}", is_user=False)
+        elif intent.name == "play_music":
+            if slots["genre"]:
+                self.play_genre(slots["genre"])
+            else:
+                self.play_music()  # Will prompt for genre or song
+        elif intent.name == "timer":
+            if slots["duration"] is None:
+                self.set_timer()  # Will prompt for duration
+                return True
+            try:
+                send_data("clock", LOOP_ARD)
+            except Exception as e:
+                print(f"Error sending data to Arduino: {e}")
+            self.add_chat_bubble(f"Cyclops: Timer set for {slots['duration']} minutes.", is_user=False)
+            threading.Thread(target=self.run_timer, args=(slots["duration"], "Text command timer"), daemon=True).start()
+        elif intent.name == "reminder":
+            if slots["date"] is None or not slots["note"]:
+                return False
+            date = slots["date"]
+            add_schedule(date.day, date.month, date.year, slots["note"])
+            self.add_chat_bubble(f"Cyclops: Added '{slots['note']}' to your schedule on "
+                                 f"{date.day} {MONTH_LIST[date.month - 1]} {date.year}.", is_user=False)
+        elif intent.name == "schedule_today":
+            self.tell_todays_schedule()
+        elif intent.name == "take_photo":
+            self.take_photo()
+        elif intent.name == "check_appearance":
+            self.check_appearance()
+        elif intent.name == "temperature":
+            self.check_temperature()
+        elif intent.name == "note":
+            self.add_note()
+        elif intent.name == "news":
+            self.news_manager()
+        else:
+            return False
+        return True
+
     def take_photo(self):
         """Take a photo using the camera"""
         try:
@@ -1011,8 +1085,8 @@ class CyclopsUI:
         """Get a response from LLM to cheer up the user"""
         try:
             # Get response from LLM
-            response, function, self.message = LLM_answer("I am feeling sad cyclopes cheer me up","yes" ,
-                                                        self.message, 
+            response, function, self.message = LLM_answer("I am feeling sad cyclopes cheer me up",
+                                                        self.message,
                                                         self.llama_model)
             
             # Remove progress indicator if it exists
@@ -1075,6 +1149,7 @@ class CyclopsUI:
             file_path = f"notes/{note_title}_{note_date.day}.txt"
             with open(file_path, "w") as f:
                 f.write(f"{note_title} : {note_date}\n{content}")
+            index_note(file_path)
             with open("working_deets.txt", "w") as f:
                 f.writelines(['Previous_Note_path: \n', file_path])
             note_dialog.destroy()
@@ -1159,7 +1234,7 @@ class CyclopsUI:
                 datetime.date(year, month, day)
                 add_schedule(day, month, year, note)
                 speak_text = f"Schedule added successfully for {day} {month} {year}."
-                threading.Thread(target=speak, args=(speak_text,), daemon=True).start()
+                speak_async(speak_text)
                 messagebox.showinfo("Success", "Schedule added successfully!")
                 note_entry.delete("1.0", ctk.END)
                 today = datetime.date.today()
@@ -1258,20 +1333,20 @@ class CyclopsUI:
             self.add_chat_bubble("Cyclops: Checking temperature...", is_user=False)
             
             # Send the existing "temph" command to Arduino
+            requested_at = time.time()
             send_data("temph", LOOP_ARD)
             
-            # Start a thread to simulate getting temperature data
-            # This allows the UI to remain responsive while "waiting" for temperature data
-            threading.Thread(target=self.display_temperature_info, daemon=True).start()
+            # Wait for the DHT reading in a thread so the UI stays responsive
+            threading.Thread(target=self.display_temperature_info, args=(requested_at,), daemon=True).start()
         except Exception as e:
             self.add_chat_bubble(f"Cyclops: Error checking temperature: {str(e)}", is_user=False)
             print(f"Error in check_temperature: {e}")
 
-    def display_temperature_info(self):
-        """Display temperature information after a short delay"""
+    def display_temperature_info(self, requested_at=0):
+        """Display the temperature reported by the Arduino's DHT sensor"""
         try:
-            # Wait a moment to simulate processing time
-            time.sleep(2)
+            # Wait for the sketch to report the reading over serial
+            reading = wait_for_temperature(requested_at)
             
             # Get current date and time
             from datetime import datetime
@@ -1279,11 +1354,18 @@ class CyclopsUI:
             current_date = datetime.now().strftime("%Y-%m-%d")
             
             # Create a formatted temperature message
-            # This assumes the Arduino is handling the actual temperature reading
-            temp_message = (
-                f"🌡️ Temperature Check at {current_time} on {current_date}\n"
-                f"Check the screen on my body\n"
-            )
+            if reading is not None:
+                temperature, humidity = reading
+                temp_message = (
+                    f"🌡️ Temperature Check at {current_time} on {current_date}\n"
+                    f"Temperature: {temperature:.1f}°C, Humidity: {humidity:.0f}%\n"
+                )
+            else:
+                # Older sketches only show the reading on the LCD
+                temp_message = (
+                    f"🌡️ Temperature Check at {current_time} on {current_date}\n"
+                    f"Check the screen on my body\n"
+                )
             
             # Display the temperature message
             self.add_chat_bubble(f"Cyclops: {temp_message}", is_user=False)
@@ -1872,12 +1954,21 @@ class CyclopsUI:
     def initialize_pir_sensor(self):
         """Initialize the PIR motion sensor without disturbing LCD display"""
         try:
+            # Motion events arrive on the serial reader thread
+            add_listener("motion", self.on_motion_event)
             # Create a separate thread for PIR initialization
             threading.Thread(target=self._pir_init_thread, daemon=True).start()
             self.add_chat_bubble("Cyclops: Motion sensor initializing in background...", is_user=False)
         except Exception as e:
             print(f"Error initializing PIR sensor: {e}")
             self.add_chat_bubble("Cyclops: Failed to initialize motion sensor.", is_user=False)
+    def on_motion_event(self, detected):
+        """Greet the user when the Arduino reports motion, at most once per MOTION_GREETING_INTERVAL"""
+        if detected and time.time() - self.last_motion_greeting >= MOTION_GREETING_INTERVAL:
+            self.last_motion_greeting = time.time()
+            self.root.after(0, lambda: self.add_chat_bubble(
+                f"Cyclops: Oh hello {self.user_name}, I noticed you there.", is_user=False))
+
     def tell_todays_schedule(self):
         """Retrieve and speak today's schedule"""
         try:
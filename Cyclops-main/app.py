@@ -1,9 +1,21 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, session, Response
 from flask_cors import CORS  # Import CORS
 from brain import *
+from session_engine import SessionStore, ModelWorker
+from metrics_engine import metrics, MAX_RECORDS
+import concurrent.futures
+import json
 import os
+import queue
+import threading
+import time
+
+MAX_STREAMS = 4  # Streaming responses open at once; each one holds a server thread
+REQUEST_TIMEOUT = 120  # Seconds a request may take, including time waiting for the model
+KEEPALIVE_INTERVAL = 15  # Seconds between comments on an idle stream so proxies keep it open
 
 app = Flask(__name__)
+app.secret_key = os.urandom(24)  # Signs the session cookie that keeps each browser's conversation apart
 CORS(app)  # Enable CORS for all routes
 
 # Rest of the code...
@@ -16,6 +28,26 @@ else:
     user_name = "User"  # Default name if no preferences are found
 
 message, llama_model = llama_message_init(USER_DETAILS)
+sessions = SessionStore(message)
+worker = ModelWorker(llama_model, sessions)
+open_streams = threading.BoundedSemaphore(MAX_STREAMS)
+
+
+def run_function(function, response):
+    # Functions like timers block until they finish, so they run on their own thread
+    # instead of holding the request (and, for /stream, its slot) open
+    threading.Thread(target=llm_interpreter, args=(function, response), name="llm-function", daemon=True).start()
+
+
+def session_id():
+    # API clients can pass their own id; browsers get one in the session cookie
+    sid = request.headers.get('X-Session-Id') or (request.get_json(silent=True) or {}).get('session_id')
+    if sid:
+        return str(sid)
+    if 'id' not in session:
+        session['id'] = SessionStore.new_id()
+    return session['id']
+
 
 # Home route
 @app.route('/')
@@ -31,15 +63,128 @@ def command():
     if not command:
         return jsonify({'response': 'No command provided'})
 
-    # Process the command using the existing brain.py functions
-    response, function, message = LLM_answer(command, message, llama_model)
+    # Process the command with this client's conversation, waiting for the model worker
+    cancelled = threading.Event()
+    try:
+        future = worker.submit(session_id(), command, cancelled=cancelled)
+    except queue.Full:
+        busy = jsonify({'response': 'Cyclops is busy right now, please try again in a moment.'})
+        return busy, 503, {'Retry-After': '5'}
+    try:
+        response, function = future.result(timeout=REQUEST_TIMEOUT)
+    except concurrent.futures.TimeoutError:
+        # Skipped if still queued; a reply already being generated is left to finish
+        cancelled.set()
+        return jsonify({'response': 'Sorry, that took too long. Please try again.'}), 504
 
     # Execute any associated function (e.g., play music, set timer, etc.)
     if function:
-        llm_interpreter(function, response)
+        run_function(function, response)
 
     return jsonify({'response': response})
 
+
+def sse(event, data):
+    return "event: " + event + "\ndata: " + json.dumps(data) + "\n\n"
+
+
+# API endpoint that streams the reply as server-sent events while it is generated
+@app.route('/stream', methods=['GET', 'POST'])
+def stream():
+    """
+    Events: "token" ({"text": raw generated text}) as the model produces it,
+    "function" ({"function", "response"}) as soon as the function call is complete,
+    then "done" ({"response", "function"}) or "error" ({"response"}).
+    """
+    data = request.get_json(silent=True) or request.args
+    command = data.get('command', '').strip()
+    if not command:
+        return jsonify({'response': 'No command provided'}), 400
+    if not open_streams.acquire(blocking=False):
+        return jsonify({'response': 'Cyclops is busy right now, please try again in a moment.'}), 503, \
+            {'Retry-After': '5'}
+
+    events = queue.Queue()
+    cancelled = threading.Event()
+    released = threading.Lock()
+
+    def close():
+        # Called once the server is done with the response, including when the client
+        # disconnects before generate() ever runs, so the slot is always given back
+        cancelled.set()
+        if released.acquire(blocking=False):
+            open_streams.release()
+
+    def on_token(text):
+        # Raising here stops generation when the client has gone or the request timed out
+        if cancelled.is_set():
+            raise TimeoutError("Stream closed")
+        events.put(("token", {'text': text}))
+
+    def on_function(function, response):
+        events.put(("function", {'function': function, 'response': response}))
+
+    try:
+        future = worker.submit(session_id(), command, on_token, on_function, cancelled)
+    except queue.Full:
+        close()
+        return jsonify({'response': 'Cyclops is busy right now, please try again in a moment.'}), 503, \
+            {'Retry-After': '5'}
+    future.add_done_callback(lambda f: events.put(("finished", None)))
+
+    def generate():
+        deadline = time.time() + REQUEST_TIMEOUT
+        try:
+            while True:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    yield sse("error", {'response': 'Sorry, that took too long. Please try again.'})
+                    return
+                try:
+                    event, payload = events.get(timeout=min(remaining, KEEPALIVE_INTERVAL))
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                if event != "finished":
+                    yield sse(event, payload)
+                    continue
+
+                try:
+                    response, function = future.result()
+                except Exception as e:
+                    yield sse("error", {'response': 'Sorry, something went wrong: ' + str(e)})
+                    return
+                yield sse("done", {'response': response, 'function': function})
+                # Execute any associated function (e.g., play music, set timer, etc.)
+                if function:
+                    run_function(function, response)
+                return
+        finally:
+            close()
+
+    response = Response(generate(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    response.call_on_close(close)
+    return response
+
+# LLM request metrics for Prometheus
+@app.route('/metrics')
+def metrics_text():
+    return Response(metrics.prometheus(), mimetype='text/plain; version=0.0.4')
+
+
+# The same metrics plus the most recent requests, for comparing model and prompt changes by hand
+@app.route('/metrics.json')
+def metrics_json():
+    summary = metrics.summary()
+    # Bad or out-of-range limits fall back into 1..MAX_RECORDS instead of failing
+    limit = request.args.get('limit', 20, type=int)
+    summary['recent'] = metrics.recent(min(max(limit, 1), MAX_RECORDS))
+    summary['sessions'] = len(sessions)
+    summary['queued_requests'] = worker.pending()
+    return jsonify(summary)
+
+
 # Run the Flask app
 if __name__ == '__main__':
-    app.run(debug=False)  # Disable debug mode to avoid Windows error 6
\ No newline at end of file
+    app.run(debug=False, threaded=True)  # Disable debug mode to avoid Windows error 6
\ No newline at end of file
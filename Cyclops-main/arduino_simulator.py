@@ -0,0 +1,224 @@
+""" Arduino Simulator: Script for emulating the Cyclops Arduino (final.ino) on a pseudo-terminal."""
+
+import os
+import threading
+import time
+import tty
+
+from physical_engine import FRAME_START, MAX_PAYLOAD, OPCODES, OP_TEXT, OP_SERVO, OP_RAW
+
+# Rough time final.ino spends in each command before it reads serial again (seconds)
+DEFAULT_DELAYS = {
+    "on": 3.0,
+    "rotate1": 1.3,
+    "rotate2": 1.3,
+    "temph": 1.1,
+    "led_blink": 1.6,
+    "motion_on": 1.0,
+    "@": 1.0,  # angle_servo() waits a second after every move
+    "#": 0.5,  # print_text() keeps the text up for half a second
+}
+DEFAULT_COMMAND_DELAY = 0.02  # Loop overhead for everything else
+OPCODE_NAMES = {code: name for name, code in OPCODES.items()}
+
+
+class ArduinoSimulator:
+    """
+    Pseudo-terminal that behaves like the Cyclops sketch on the other end of the serial link.
+
+    It understands the final.ino command set, the "!<seq>" framed text protocol and
+    binary frames, answers with the same lines the sketch prints ("ACK <seq>",
+    "DHT <t> <h>", "Motion detected!") and models both the link speed (10 bits per
+    byte at the given baud rate) and the time the sketch spends in each command.
+
+    Point physical_engine at it with physical_engine.configure(port=sim.port, reset_delay=0).
+    """
+
+    def __init__(self, baud_rate=9600, delay_scale=1.0, delays=None, supports_ack=True,
+                 supports_binary=True, temperature=24.5, humidity=55.0):
+        """
+        Args:
+            baud_rate (int): Simulated link speed; 0 disables link timing.
+            delay_scale (float): Multiplier for the per-command processing delays.
+            delays (dict): Overrides for DEFAULT_DELAYS.
+            supports_ack (bool): Emulate a sketch that acknowledges framed commands.
+            supports_binary (bool): Emulate a sketch that accepts binary frames.
+            temperature (float): DHT temperature reported for "temph".
+            humidity (float): DHT humidity reported for "temph".
+        """
+        self.baud_rate = baud_rate
+        self.delay_scale = delay_scale
+        self.delays = dict(DEFAULT_DELAYS, **(delays or {}))
+        self.supports_ack = supports_ack
+        self.supports_binary = supports_binary
+        self.temperature = temperature
+        self.humidity = humidity
+
+        self.binary_mode = False
+        self.received = []  # (time executed, command) in execution order
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.running = False
+        self.buffer = bytearray()
+        self.last_activity = time.time()
+        self.write_lock = threading.Lock()
+
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)  # No echo or CR/LF translation, like a real USB serial port
+        self.port = os.ttyname(self.slave)
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name="arduino-simulator", daemon=True)
+        self.thread.start()
+        self.println("Cyclops system ready")
+        return self
+
+    def stop(self):
+        self.running = False
+        for fd in (self.master, self.slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def wait_idle(self, quiet=0.5, timeout=60):
+        """Wait until nothing has been received or executed for 'quiet' seconds."""
+        deadline = time.time() + timeout
+        time.sleep(quiet)  # Give bytes that were just written time to arrive
+        while time.time() < deadline and time.time() - self.last_activity < quiet:
+            time.sleep(0.05)
+
+    def link_delay(self, n_bytes):
+        # 8N1 framing puts 10 bits on the wire per byte
+        if self.baud_rate:
+            time.sleep(n_bytes * 10 / self.baud_rate)
+
+    def println(self, line):
+        data = (line + "\r\n").encode('utf-8')
+        with self.write_lock:
+            self.link_delay(len(data))
+            try:
+                os.write(self.master, data)
+            except OSError:
+                return
+            self.bytes_out += len(data)
+
+    def trigger_motion(self, detected=True):
+        """Report a PIR state change the way checkMotion() does."""
+        self.println("Motion state changed to: " + ("Motion Detected" if detected else "No Motion"))
+        self.println("Motion detected!" if detected else "Motion ended!")
+
+    def run(self):
+        while self.running:
+            try:
+                chunk = os.read(self.master, 256)
+            except OSError:
+                break
+            if not chunk:
+                continue
+            self.last_activity = time.time()
+            self.link_delay(len(chunk))
+            self.bytes_in += len(chunk)
+            self.buffer.extend(chunk)
+
+            # The sketch handles one command per loop() pass, in order
+            while self.running:
+                cmd = self.next_command()
+                if cmd is None:
+                    break
+                self.execute(cmd)
+                self.last_activity = time.time()
+
+    def next_command(self):
+        """Pop one complete command off the input buffer, or None if more bytes are needed."""
+        if self.binary_mode:
+            return self.next_binary_command()
+
+        end = self.buffer.find(b"\r")
+        if end < 0:
+            return None
+        line = self.buffer[:end].decode('utf-8', errors='ignore')
+        del self.buffer[:end + 1]
+        self.println("Received command: " + line)
+
+        if line.startswith("!") and self.supports_ack:
+            seq, _, line = line[1:].partition(" ")
+            self.println("ACK " + seq)
+        if line == "binary" and self.supports_ack and self.supports_binary:
+            self.binary_mode = True
+            self.println("BIN 1")
+            return ""
+        return line
+
+    def next_binary_command(self):
+        # Drop bytes until a frame start, like read_binary_command() in final.ino
+        while self.buffer and self.buffer[0] != FRAME_START:
+            del self.buffer[0]
+        if len(self.buffer) < 4:
+            return None
+        op, seq, length = self.buffer[1], self.buffer[2], self.buffer[3]
+        if length > MAX_PAYLOAD:
+            del self.buffer[0]
+            return ""
+        if len(self.buffer) < 5 + length:
+            return None
+        payload = bytes(self.buffer[4:4 + length])
+        check = self.buffer[4 + length]
+        del self.buffer[:5 + length]
+
+        checksum = op ^ seq ^ length
+        for b in payload:
+            checksum ^= b
+        if checksum != check:
+            self.println("NAK")
+            return ""
+        self.println("ACK " + str(seq))
+
+        if op == OP_TEXT:
+            return "#" + payload.decode('ascii', errors='replace')
+        if op == OP_SERVO and length == 1:
+            return "@" + str(payload[0])
+        if op == OP_RAW:
+            return payload.decode('ascii', errors='replace')
+        return OPCODE_NAMES.get(op, "")
+
+    def command_delay(self, cmd):
+        if cmd in self.delays:
+            return self.delays[cmd]
+        if cmd[:1] in ("@", "#") and not cmd.startswith("#MusicWave"):
+            return self.delays[cmd[0]]
+        return DEFAULT_COMMAND_DELAY
+
+    def execute(self, cmd):
+        if cmd in ("", "a", "ping"):
+            return
+        self.received.append((time.time(), cmd))
+        time.sleep(self.command_delay(cmd) * self.delay_scale)
+
+        if cmd == "temph":
+            self.println("DHT " + format(self.temperature, ".2f") + " " + format(self.humidity, ".2f"))
+        elif cmd == "motion_on":
+            self.println("Motion detection activated")
+        elif cmd == "motion_off":
+            self.println("Motion detection deactivated")
+        elif cmd == "pir_init_silent":
+            self.println("PIR sensor initialized silently")
+
+
+if __name__ == '__main__':
+    # Run a standalone simulator so the UI or brain can be pointed at it by hand
+    with ArduinoSimulator() as simulator:
+        print("Simulated Arduino on " + simulator.port + " (set physical_engine.COM_PORT to this)")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
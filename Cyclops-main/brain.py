@@ -481,11 +481,13 @@ import datetime
 import pygame
 
 from llm_engine import LLM_answer, llama_message_init
+from function_engine import parse_function
+from intent_engine import classify
 from image_engine import scrape_images
 import cv2 as cv
 import numpy as np
 from listner_engine import get_audio
-from voice_engine import speak
+from voice_engine import speak, SentenceSpeaker
 from news_engine import get_news_science, get_news_world
 from music_engine import play_music, play_youtube_video
 from pygame import mixer
@@ -567,13 +569,15 @@ def llm_interpreter(func, res):
        Function to interpret the LLM response and execute corresponding actions.
     """
 
-    brack_start = func.find("(")
-    brack_end = func.find(")")
-    f_name = func[0:brack_start]
-    match f_name:
+    call = parse_function(func)
+    if call is None:
+        print("No Function")
+        return
+
+    match call.name:
         case "show_image":
-            send_data("#" + response, LOOP_ARD)
-            image_name = func[brack_start + 1:brack_end]
+            send_data("#" + res, LOOP_ARD)
+            image_name = call.args["subject"]
             if len(image_name) < 1:
                 image_name = res.split()[-2]
             scrape_images(image_name)
@@ -594,18 +598,15 @@ def llm_interpreter(func, res):
 
         case "play_youtube":
             send_data("sine", LOOP_ARD)
-            yt_search = func[brack_start + 1:brack_end]
+            yt_search = call.args["query"]
             play_youtube_video(yt_search)
 
         case "schedule":
             send_data("#Scheduler", LOOP_ARD)
-            first_comma = func.find(",")
-            second_comma = func.find(",", first_comma + 1)
-            third_comma = func.find(",", second_comma + 1)
-            day = func[brack_start + 1:first_comma].strip()
-            month = func[first_comma + 1:second_comma].strip()
-            year = func[second_comma + 1:third_comma].strip()
-            note = func[third_comma + 1:brack_end].strip()
+            day = str(call.args["day"])
+            month = str(call.args["month"])
+            year = str(call.args["year"])
+            note = call.args["note"]
             print("Should I set the schedule on " + day + " of " + month + " year " + year)
             speak("Should I set the schedule on " + day + " of " + month + " year " + year)
             if CONTROL_TYPE == 0:  # To use audio input
@@ -638,23 +639,86 @@ def llm_interpreter(func, res):
 
         case "timer":
             send_data('clock', LOOP_ARD)
-            time_to_set = 0
-            if "minutes" in func:
-                time_to_set = int(func[brack_start + 1:func.find("minutes")].strip())
-                message_timer = func[func.find(","):brack_end]
-            elif "seconds" in func:
-                time_to_set = int(func[brack_start + 1:func.find("seconds")].strip())
-                message_timer = func[func.find(","):brack_end]
-            else:
-                time_to_set = 1
-                message_timer = 'default one minute timer done because sometimes llm are dumb'
-
-            timer_set(time_to_set, message_timer)
+            timer_set(call.args["minutes"], call.args["message"])
 
         case _:
             print("No Function")
 
 
+def handle_intent(intent):
+    """
+       Function to carry out a routine command recognized by the intent classifier.
+       Returns False if the command still needs the LLM (e.g. a timer without a duration).
+    """
+
+    if intent is None:
+        return False
+
+    slots = intent.slots
+    match intent.name:
+        case "time":
+            send_data('rotate2', 1)
+            current_time = datetime.datetime.now()
+            speak("Current time is " + str(current_time.hour) + " hours " + str(current_time.minute) + " minutes")
+
+        case "date":
+            send_data('rotate2', 1)
+            current_date = datetime.datetime.now()
+            speak("Current date is " + str(current_date.day) + " of " + MONTH_LIST[current_date.month - 1])
+
+        case "play_music":
+            send_data("sine", LOOP_ARD)
+            play_music(slots["genre"] or "techno")
+
+        case "timer":
+            if slots["duration"] is None:
+                return False
+            send_data('clock', LOOP_ARD)
+            timer_set(slots["duration"], "Timer done")
+
+        case "reminder":
+            if slots["date"] is None or not slots["note"]:
+                return False
+            date = slots["date"]
+            send_data("#Scheduler", LOOP_ARD)
+            add_schedule(date.day, date.month, date.year, slots["note"])
+            print("Schedule added for " + str(date))
+            speak("Ok, I will remind you on " + str(date.day) + " of " + MONTH_LIST[date.month - 1])
+
+        case "schedule_today":
+            today_schedule = check_schedule()
+            send_data("#" + today_schedule, LOOP_ARD)
+            print(today_schedule)
+            speak(today_schedule)
+
+        case "take_photo":
+            send_data("camera", LOOP_ARD)
+            show_my_face(0, 1)
+
+        case "check_appearance":
+            send_data('camera', LOOP_ARD)
+            show_my_face()
+
+        case "temperature":
+            send_data("temph", LOOP_ARD)
+            print("Check the screen on my body")
+            speak("Check the screen on my body")
+
+        case "note":
+            send_data("#Note Engine....", LOOP_ARD)
+            noting_begin()
+
+        case "news":
+            send_data("#News Today", LOOP_ARD)
+            get_news_world()
+            get_news_science()
+
+        case _:
+            return False
+
+    return True
+
+
 def first_boot_today():
     """
        Function to be executed on the first boot of the day.
@@ -938,12 +1002,20 @@ if __name__ == '__main__':
                         CONTROL_TYPE = 0
 
                     else:
+                        # Routine commands worded differently are recognized locally before asking the LLM
+                        if handle_intent(classify(audio_inp)):
+                            continue
+
                         speak("Let me think")
                         send_data("#LLM Thinking     Please Wait", LOOP_ARD)
-                        response, function, message = LLM_answer(audio_inp, message, llama_model)
+                        speaker = SentenceSpeaker()  # Starts speaking while the LLM is still generating
+                        response, function, message = LLM_answer(audio_inp, message, llama_model, speaker.feed)
                         print(response)
                         send_data('rotate2', 1)
-                        speak(response)
+                        if speaker.finish():
+                            speaker.wait()
+                        else:
+                            speak(response)
                         print(function)
                         llm_interpreter(function, response)
 
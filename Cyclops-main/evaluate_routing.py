@@ -0,0 +1,198 @@
+""" Evaluate Routing: Script for measuring how often the LLM picks the right function for a command, and how fast."""
+
+import argparse
+import contextlib
+import json
+import re
+import sys
+import tempfile
+import time
+
+import llm_engine
+from function_engine import parse_function
+from intent_engine import extract_date, extract_duration
+from llm_engine import ConversationContext, LLM_answer, build_prefix, create_llama, model_config, response_cache
+from metrics_engine import percentile
+
+CORPUS_PATH = "eval_corpus.json"
+
+
+class StubLlama:
+    """
+    Stand-in for the Llama model that routes commands by keywords, for running the harness without a GGUF file.
+
+    It answers in the few-shot format ("@Response: ... #Function:name(args)*") and
+    supports what llm_engine uses of llama-cpp (tokenize, n_ctx, eval, saved
+    states and streaming), so a CI run exercises the whole LLM_answer path. Its
+    scores measure the pipeline, not a model.
+    """
+
+    model_path = "stub"
+
+    def __init__(self, n_ctx=3046):
+        self.context_size = n_ctx
+        self.input_ids = []
+        self.n_tokens = 0
+
+    def tokenize(self, text, add_bos=True):
+        return text.decode('utf-8').split()
+
+    def n_ctx(self):
+        return self.context_size
+
+    def reset(self):
+        self.input_ids = []
+        self.n_tokens = 0
+
+    def eval(self, tokens):
+        self.input_ids = list(tokens)
+        self.n_tokens = len(self.input_ids)
+
+    def save_state(self):
+        return list(self.input_ids)
+
+    def load_state(self, state):
+        self.eval(state)
+
+    @staticmethod
+    def reply(command):
+        text = command.lower()
+        duration = extract_duration(text)
+        date = extract_date(text)
+        if duration is not None and re.search(r"\btim(er|e)\b", text):
+            return "@Response: Sure, your timer is running. #Function:timer(" + str(duration) + " minutes,Timer done)"
+        if date is not None and re.search(r"\b(remind|schedule|add|appointment|meeting)\b", text):
+            return ("@Response: Ok I will add this to the scheduler. #Function:schedule(" + str(date.day) + ", " +
+                    str(date.month) + ", " + str(date.year) + ", " + command + ")")
+        if re.search(r"\b(game|hangman|jumper|rock paper)\b", text):
+            return "@Response: Let's play! #Function:play_game(" + command + ")"
+        if re.search(r"\b(play|music|song|video|listen|tutorial)\b", text):
+            return "@Response: Here you go. #Function:play_youtube(" + command + ")"
+        if re.search(r"\b(what is|what does|show me|look like|looks)\b", text):
+            return "@Response: Let me show you. #Function:show_image(" + command + ")"
+        return "@Response: I am always happy to talk with you. #Function:plain_conversation()"
+
+    def __call__(self, prompt, max_tokens=16, stop=None, stream=False, grammar=None):
+        self.eval(self.tokenize(prompt.encode('utf-8')))
+        # The command is the last line of the last turn; notes found for it come before it
+        command = prompt[prompt.rfind("[INST]") + len("[INST]"):prompt.rfind("[/INST]")].strip().split("\n")[-1]
+        text = self.reply(command) + "*"
+        if not stream:
+            return {"choices": [{"text": text[:text.find("*")]}], "usage": {"completion_tokens": len(text.split())}}
+        return ({"choices": [{"text": word}]} for word in re.findall(r"\S+\s*", text))
+
+
+def load_corpus(path=CORPUS_PATH):
+    """Labeled commands: [{"prompt": ..., "function": expected name, "args": optional expected arguments}]."""
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def args_match(expected, actual):
+    """Whether every expected argument was parsed with that value (numbers compared as numbers)."""
+    for key, value in expected.items():
+        got = actual.get(key)
+        if isinstance(value, (int, float)):
+            if not isinstance(got, (int, float)) or abs(got - value) > 1e-6:
+                return False
+        elif str(got).strip().lower() != str(value).strip().lower():
+            return False
+    return True
+
+
+def evaluate(llama_model, corpus, stream=False):
+    """
+    Run every command through LLM_answer and format_response, each in a fresh conversation.
+
+    The response cache is cleared before each command so every answer is generated.
+
+    Returns:
+        dict: Routing accuracy, argument parse rate, argument accuracy, latency percentiles and the runs.
+    """
+    prefix = build_prefix("")
+    runs = []
+    for case in corpus:
+        response_cache.clear()
+        context = ConversationContext(prefix)
+        on_token = (lambda text: None) if stream else None
+        start = time.time()
+        response, function, _ = LLM_answer(case["prompt"], context, llama_model, on_token)
+        latency = time.time() - start
+        call = parse_function(function)
+        run = {
+            "prompt": case["prompt"],
+            "expected": case["function"],
+            "response": response.strip(),
+            "function": function,
+            "latency": latency,
+            "parsed": call is not None,
+            "routed": call is not None and call.name == case["function"],
+        }
+        if "args" in case:
+            run["args_correct"] = run["routed"] and args_match(case["args"], call.args)
+        runs.append(run)
+    response_cache.clear()
+
+    latencies = [run["latency"] for run in runs]
+    with_args = [run for run in runs if "args_correct" in run]
+    functions = sorted({case["function"] for case in corpus})
+    return {
+        "commands": len(runs),
+        "routing_accuracy": sum(run["routed"] for run in runs) / len(runs),
+        "parse_rate": sum(run["parsed"] for run in runs) / len(runs),
+        "args_accuracy": sum(run["args_correct"] for run in with_args) / len(with_args) if with_args else None,
+        "latency_p50": percentile(latencies, 50),
+        "latency_p95": percentile(latencies, 95),
+        "by_function": {name: sum(run["routed"] for run in runs if run["expected"] == name) /
+                        sum(1 for run in runs if run["expected"] == name) for name in functions},
+        "runs": runs,
+    }
+
+
+def print_results(result):
+    print("Commands:             %6d" % result["commands"])
+    print("Routing accuracy:     %6.0f %%" % (result["routing_accuracy"] * 100))
+    print("Calls parsed:         %6.0f %%" % (result["parse_rate"] * 100))
+    if result["args_accuracy"] is not None:
+        print("Arguments correct:    %6.0f %%" % (result["args_accuracy"] * 100))
+    print("Latency p50/p95:      %6.2f / %.2f s" % (result["latency_p50"], result["latency_p95"]))
+    for name, accuracy in result["by_function"].items():
+        print("  %-20s %4.0f %%" % (name, accuracy * 100))
+    for run in result["runs"]:
+        if not run["routed"]:
+            print("    expected " + run["expected"] + " for '" + run["prompt"] + "', got '" + run["function"] + "'")
+        elif run.get("args_correct") is False:
+            print("    wrong arguments for '" + run["prompt"] + "': " + run["function"])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measure how well the LLM routes commands to functions.")
+    parser.add_argument("--corpus", default=CORPUS_PATH, help="labeled commands")
+    parser.add_argument("--model", help="models.json entry to evaluate (default: the configured model)")
+    parser.add_argument("--stub", action="store_true", help="use the keyword stub instead of a model, e.g. in CI")
+    parser.add_argument("--stream", action="store_true", help="generate with streaming, as the voice loop does")
+    parser.add_argument("--no-grammar", action="store_true", help="generate without the function-call grammar")
+    parser.add_argument("--min-accuracy", type=float, default=0.0,
+                        help="exit with an error if routing accuracy is below this (0-1)")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    llm_engine.USE_GRAMMAR = not args.no_grammar
+    # Results must not depend on what happens to be in the notes folder
+    llm_engine.USE_RETRIEVAL = False
+    if args.stub:
+        # Keep the stub's prompt states out of the real model's prefix cache
+        llm_engine.PREFIX_CACHE_DIR = tempfile.mkdtemp(prefix="cyclops_eval_")
+        model = StubLlama()
+    else:
+        model = create_llama(model_config(args.model))
+
+    # LLM_answer prints its timings; keep them out of the JSON
+    with contextlib.redirect_stdout(sys.stderr if args.json else sys.stdout):
+        result = evaluate(model, load_corpus(args.corpus), stream=args.stream)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_results(result)
+    if result["routing_accuracy"] < args.min_accuracy:
+        sys.exit(1)
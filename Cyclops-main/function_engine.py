@@ -0,0 +1,170 @@
+""" Function Engine: Script for constraining and parsing the function calls the LLM picks."""
+
+import re
+
+from scheduler_engine import month_list
+
+# GBNF grammar for "@Response: ... #Function:name(args)", used to constrain generation
+RESPONSE_GRAMMAR = r"""
+root ::= [ \t\n]* "@Response:" response "#Function:" call
+response ::= [^#*]+
+call ::= show-image | timer | play-youtube | schedule | play-game | plain-conversation
+show-image ::= "show_image(" text ")"
+timer ::= "timer(" sp number sp unit sp "," text ")"
+unit ::= "minutes" | "minute" | "seconds" | "second" | "hours" | "hour"
+play-youtube ::= "play_youtube(" text ")"
+schedule ::= "schedule(" sp number sp "," sp month sp "," sp number sp "," text ")"
+month ::= number | [A-Za-z]+
+play-game ::= "play_game(" text ")"
+plain-conversation ::= "plain_conversation()"
+number ::= [0-9]+
+text ::= [^()*#\n]*
+sp ::= " "?
+"""
+
+CALL_PATTERN = re.compile(r"([A-Za-z_]+)\s*\((.*?)\)", re.S)
+TIMER_PATTERN = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*(hours?|hrs?|minutes?|mins?|seconds?|secs?)?\s*(?:,(.*))?$", re.S)
+DEFAULT_TIMER_MESSAGE = 'default one minute timer done because sometimes llm are dumb'
+
+
+class FunctionCall:
+    """
+    A function call picked by the LLM, with its arguments parsed into their types.
+
+    name is one of the functions listed in the prompt and args a dict whose keys
+    depend on it:
+        show_image: subject (str)
+        timer: minutes (float), message (str)
+        play_youtube: query (str)
+        schedule: day (int), month (int), year (int), note (str)
+        play_game: game (str)
+        plain_conversation: nothing
+    """
+
+    def __init__(self, name, args, text):
+        self.name = name
+        self.args = args
+        self.text = text  # The call as generated, e.g. "timer(2 minutes,Eggs are done)"
+
+    def __str__(self):
+        return self.text
+
+    def __repr__(self):
+        return "FunctionCall(" + repr(self.name) + ", " + repr(self.args) + ")"
+
+    def __eq__(self, other):
+        return isinstance(other, FunctionCall) and (self.name, self.args) == (other.name, other.args)
+
+
+def parse_show_image(body):
+    return {"subject": body.strip()}
+
+
+def parse_timer(body):
+    match = TIMER_PATTERN.match(body)
+    if match is None:
+        # The old interpreter fell back to a one minute timer rather than doing nothing
+        return {"minutes": 1, "message": DEFAULT_TIMER_MESSAGE}
+    amount = float(match.group(1))
+    unit = (match.group(2) or "minutes").lower()
+    if unit.startswith("h"):
+        amount *= 60
+    elif unit.startswith("s"):
+        amount /= 60
+    minutes = int(amount) if amount == int(amount) else amount
+    return {"minutes": minutes, "message": (match.group(3) or "").strip() or "Timer done"}
+
+
+def parse_month(value):
+    value = value.strip().lower()
+    if value.isdigit():
+        return int(value)
+    for i, month in enumerate(month_list):
+        if len(value) >= 3 and month.startswith(value):
+            return i + 1
+    raise ValueError("Unknown month: " + value)
+
+
+def parse_schedule(body):
+    parts = body.split(",", 3)
+    if len(parts) < 4:
+        raise ValueError("schedule needs day, month, year and a note")
+    day, month, year = int(parts[0].strip()), parse_month(parts[1]), int(parts[2].strip())
+    if not 1 <= day <= 31 or not 1 <= month <= 12:
+        raise ValueError("Invalid date: " + body)
+    return {"day": day, "month": month, "year": year, "note": parts[3].strip()}
+
+
+def parse_play_youtube(body):
+    return {"query": body.strip()}
+
+
+def parse_play_game(body):
+    return {"game": body.strip()}
+
+
+def parse_plain_conversation(body):
+    return {}
+
+
+PARSERS = {
+    "show_image": parse_show_image,
+    "timer": parse_timer,
+    "play_youtube": parse_play_youtube,
+    "schedule": parse_schedule,
+    "play_game": parse_play_game,
+    "plain_conversation": parse_plain_conversation,
+}
+
+
+def parse_function(text):
+    """
+    Parse a function call such as "schedule(24, 6, 2023, Friend's birthday wish)".
+
+    Returns:
+        FunctionCall: The parsed call, or None if text holds no known, well-formed call.
+    """
+    match = CALL_PATTERN.search(text or "")
+    if match is None or match.group(1) not in PARSERS:
+        return None
+    try:
+        args = PARSERS[match.group(1)](match.group(2))
+    except ValueError as e:
+        print("Could not parse function call " + match.group(0) + ": " + str(e))
+        return None
+    return FunctionCall(match.group(1), args, match.group(0))
+
+
+def split_response(text):
+    """
+    Split a generated reply into the spoken response and the function call text.
+
+    Returns:
+        tuple: (response, function) where function is the call exactly as generated,
+        or everything after "#Function:" if it is not a well-formed call.
+    """
+    marker = text.find("#")
+    head, tail = (text, "") if marker < 0 else (text[:marker], text[marker + 1:])
+    tag = head.find("@")
+    if tag >= 0 and ":" in head[tag:]:
+        head = head[head.find(":", tag) + 1:]
+    if tail.lower().startswith("function"):
+        tail = tail[tail.find(":") + 1:] if ":" in tail else tail[len("function"):]
+    call = parse_function(tail)
+    return head, call.text if call is not None else tail.strip()
+
+
+grammar = None
+
+
+def response_grammar():
+    """The compiled LlamaGrammar for replies, or None if llama-cpp cannot build it."""
+    global grammar
+    if grammar is None:
+        try:
+            from llama_cpp import LlamaGrammar
+            grammar = LlamaGrammar.from_string(RESPONSE_GRAMMAR, verbose=False)
+        except Exception as e:
+            print("Generating without a grammar: " + str(e))
+            grammar = False
+    return grammar or None
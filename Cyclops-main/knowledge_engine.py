@@ -0,0 +1,121 @@
+""" Knowledge Engine: Script for answering known questions from knowledge_base.json without the LLM."""
+
+import json
+import os
+import threading
+
+KNOWLEDGE_BASE_PATH = "knowledge_base.json"
+
+
+class KeywordIndex:
+    """
+    Aho-Corasick automaton over the keywords of every knowledge base entry.
+
+    One pass over the prompt finds every keyword it contains, however many
+    entries there are. Matching is on lowercase substrings, like the
+    "keyword in prompt.lower()" checks it replaces.
+    """
+
+    def __init__(self):
+        self.goto = [{}]  # state -> {character: next state}
+        self.fail = [0]
+        self.outputs = [set()]  # state -> (entry index, keyword length) of the keywords that end here
+
+    def add(self, keyword, entry):
+        state = 0
+        for char in keyword.lower():
+            if char not in self.goto[state]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.outputs.append(set())
+                self.goto[state][char] = len(self.goto) - 1
+            state = self.goto[state][char]
+        self.outputs[state].add((entry, len(keyword)))
+
+    def build(self):
+        """Compute the failure links; call once after adding every keyword."""
+        queue = list(self.goto[0].values())  # Children of the root fall back to the root
+        for state in queue:
+            for char, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                self.outputs[child] |= self.outputs[self.fail[child]]
+
+    def search(self, text):
+        """Return {entry index: length of its longest keyword in text} for every entry with a keyword in text."""
+        found = {}
+        state = 0
+        for char in text.lower():
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            for entry, length in self.outputs[state]:
+                found[entry] = max(found.get(entry, 0), length)
+        return found
+
+
+class KnowledgeBase:
+    """
+    Canned answers loaded from a JSON file.
+
+    Each entry has a name, a list of keywords, the response and the function to
+    run. When a prompt contains keywords of several entries, the entry with the
+    longest matching keyword wins, as the most specific one ("u soe paing" over
+    "miit" in "who is u soe paing at miit"); on a tie the one listed first in the
+    file wins. The file is reloaded when it changes.
+    """
+
+    def __init__(self, path=KNOWLEDGE_BASE_PATH):
+        self.path = path
+        self.entries = []
+        self.index = KeywordIndex()
+        self.mtime = None
+        self.lock = threading.Lock()
+
+    def load(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime == self.mtime:
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except Exception as e:
+            print("Could not load the knowledge base: " + str(e))
+            return
+
+        index = KeywordIndex()
+        for i, entry in enumerate(entries):
+            for keyword in entry.get("keywords", []):
+                index.add(keyword, i)
+        index.build()
+        self.entries, self.index, self.mtime = entries, index, mtime
+
+    def lookup(self, prompt):
+        """
+        Find the canned answer for a prompt.
+
+        Returns:
+            tuple: (response, function) of the matching entry, or None.
+        """
+        with self.lock:
+            self.load()
+            entries, index = self.entries, self.index
+        matches = index.search(prompt)
+        if not matches:
+            return None
+        # Longest keyword first, then the entry listed first
+        entry = entries[min(matches, key=lambda i: (-matches[i], i))]
+        return entry["response"], entry.get("function", "")
+
+
+knowledge_base = KnowledgeBase()
+
+
+def lookup(prompt):
+    return knowledge_base.lookup(prompt)
@@ -2,10 +2,23 @@
 
 from silence_tensorflow import silence_tensorflow
 silence_tensorflow()
+import atexit
+import json
+import queue
+import threading
+import time
 from pygame import mixer
 from vosk import Model, KaldiRecognizer, SetLogLevel
 import pyaudio
-from voice_engine import speak
+from voice_engine import speak, is_speaking
+
+SAMPLE_RATE = 16000  # The Vosk model expects 16 kHz mono 16-bit audio
+CHUNK_FRAMES = 4096  # Frames read from the microphone at a time
+RING_SECONDS = 10  # Audio the ring buffer holds if recognition falls behind
+MAX_UTTERANCES = 16  # Recognized utterances kept for get_audio; the oldest are dropped beyond this
+MAX_UTTERANCE_AGE = 30  # Seconds after which an unclaimed utterance is too old to answer
+REOPEN_INTERVAL = 2  # Seconds to wait before reopening a microphone that failed
+IGNORE_WHILE_SPEAKING = True  # Drop utterances heard while Cyclops was talking (its own voice)
 
 # Set log level for Vosk to suppress non-error logs
 SetLogLevel(-1)
@@ -21,41 +34,198 @@ speak("Initializing Listener Engine")
 model = Model("Models/vosk-model-en-us-0.22")
 
 # Initialize the KaldiRecognizer with the model and sample rate
-recognizer = KaldiRecognizer(model, 16000)
+recognizer = KaldiRecognizer(model, SAMPLE_RATE)
 
 # Initialize the PyAudio object for working with the microphone
 mic = pyaudio.PyAudio()
 
 
+class RingBuffer:
+    """
+    Fixed-size byte ring buffer for one writer thread and one reader thread.
+
+    The memory is allocated once. write_pos is only advanced by the writer and
+    read_pos only by the reader, each after its copy is done, so the two
+    threads never need a lock. When the reader falls a whole buffer behind,
+    new audio is dropped (and counted) rather than overwriting unread audio.
+    """
+
+    def __init__(self, size):
+        self.buffer = bytearray(size)
+        self.size = size
+        self.write_pos = 0  # Total bytes ever written
+        self.read_pos = 0  # Total bytes ever read
+        self.dropped = 0  # Bytes lost because the buffer was full
+
+    def available(self):
+        return self.write_pos - self.read_pos
+
+    def write(self, data):
+        n = len(data)
+        if n > self.size - self.available():
+            self.dropped += n
+            return False
+        start = self.write_pos % self.size
+        first = min(n, self.size - start)
+        self.buffer[start:start + first] = data[:first]
+        self.buffer[:n - first] = data[first:]
+        self.write_pos += n
+        return True
+
+    def read(self, max_bytes):
+        n = min(max_bytes, self.available())
+        start = self.read_pos % self.size
+        first = min(n, self.size - start)
+        data = bytes(self.buffer[start:start + first]) + bytes(self.buffer[:n - first])
+        self.read_pos += n
+        return data
+
+
+class Listener:
+    """
+    Keeps the microphone open and recognizes speech continuously.
+
+    A capture thread reads the microphone into a RingBuffer and a recognizer
+    thread feeds that audio to Vosk, queueing each finished utterance with the
+    time it ended. The stream is opened once (and reopened only after an error),
+    and speech that arrives while the rest of the bot is busy waits in the queue
+    for the next get() instead of being lost.
+    """
+
+    def __init__(self, pyaudio_instance, kaldi_recognizer):
+        self.mic = pyaudio_instance
+        self.recognizer = kaldi_recognizer
+        self.ring = RingBuffer(SAMPLE_RATE * 2 * RING_SECONDS)
+        self.data_ready = threading.Event()
+        self.utterances = queue.Queue(maxsize=MAX_UTTERANCES)  # (time it ended, text, heard while speaking)
+        self.stream = None
+        self.running = False
+        self.threads = []
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.threads = [threading.Thread(target=self.capture, name="mic-capture", daemon=True),
+                        threading.Thread(target=self.recognize, name="speech-recognizer", daemon=True)]
+        for thread in self.threads:
+            thread.start()
+
+    def open_stream(self):
+        return self.mic.open(format=pyaudio.paInt16, channels=1, rate=SAMPLE_RATE, input=True,
+                             frames_per_buffer=CHUNK_FRAMES)
+
+    def close_stream(self):
+        stream, self.stream = self.stream, None
+        if stream is None:
+            return
+        try:
+            stream.stop_stream()
+            stream.close()
+        except Exception as e:
+            print("Error closing mic: " + str(e))
+
+    def capture(self):
+        while self.running:
+            try:
+                if self.stream is None:
+                    self.stream = self.open_stream()
+                data = self.stream.read(CHUNK_FRAMES, exception_on_overflow=False)
+            except Exception as e:
+                # Handle exceptions related to microphone errors
+                print("Error in Mic: " + str(e))
+                self.close_stream()
+                time.sleep(REOPEN_INTERVAL)
+                continue
+            self.ring.write(data)
+            self.data_ready.set()
+        self.close_stream()
+
+    def recognize(self):
+        heard_while_speaking = False
+        while self.running:
+            # Clear before checking so a write between the check and the wait still wakes us
+            self.data_ready.clear()
+            if not self.ring.available():
+                self.data_ready.wait(0.5)
+                continue
+            data = self.ring.read(CHUNK_FRAMES * 2)
+            heard_while_speaking = heard_while_speaking or is_speaking()
+
+            # Use Vosk to accept the waveform data and get the recognition result
+            if self.recognizer.AcceptWaveform(data):
+                text = json.loads(self.recognizer.Result()).get("text", "").lower()
+                # Empty results only matter to a caller already waiting, as before
+                if text or self.utterances.empty():
+                    self.put((time.time(), text, heard_while_speaking))
+                heard_while_speaking = False
+
+    def put(self, utterance):
+        while True:
+            try:
+                self.utterances.put_nowait(utterance)
+                return
+            except queue.Full:
+                try:
+                    self.utterances.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def get(self, since=0.0):
+        """
+        Next utterance that ended after since, waiting for one if none is queued.
+
+        Utterances older than MAX_UTTERANCE_AGE and, if IGNORE_WHILE_SPEAKING is set,
+        ones heard while Cyclops was talking are skipped, as are empty results
+        when real speech is queued behind them.
+        """
+        self.start()
+        while True:
+            ended, text, heard_while_speaking = self.utterances.get()
+            if ended < since or ended < time.time() - MAX_UTTERANCE_AGE:
+                continue
+            if IGNORE_WHILE_SPEAKING and heard_while_speaking:
+                continue
+            if not text and not self.utterances.empty():
+                continue
+            return text
+
+    def stop(self):
+        self.running = False
+        for thread in self.threads:
+            thread.join(timeout=2)
+        self.close_stream()
+
+
+# The microphone is opened on the first get_audio call, not at import
+listener = Listener(mic, recognizer)
+
+
+def stop_listening():
+    """Stop the capture threads and release the microphone, e.g. on shutdown."""
+    listener.stop()
+    mic.terminate()
+
+
+atexit.register(stop_listening)
+
+
 def get_audio(flag=0):
-    # Open the microphone stream
-    stream = mic.open(format=pyaudio.paInt16, channels=1, rate=16000, input=True, frames_per_buffer=8192)
-    data = ""
+    """
+    Recognized text of the next thing the user says, in lowercase.
+
+    With flag 0 the user is being asked something: a tone is played and only
+    speech after it counts. Otherwise anything said since the last call is
+    returned first.
+    """
+    since = 0.0
 
     # If flag is 0, play a system error notice tone
     if flag == 0:
+        since = time.time()
         print("Start Speaking....")
         mixer.music.load('D:\Cyclops\Cyclops-main\Cyclops\music_and_tones\system-error-notice-132470.mp3')
         mixer.music.set_volume(0.2)
         mixer.music.play()
 
-    try:
-        # Start streaming audio data from the microphone
-        stream.start_stream()
-
-        # Continue streaming until a valid recognition result is obtained
-        while True:
-            data = stream.read(4096)
-
-            # Use Vosk to accept the waveform data and get the recognition result
-            if recognizer.AcceptWaveform(data):
-                text = recognizer.Result()
-                break
-
-    except Exception as e:
-        # Handle exceptions related to microphone errors
-        text = "Error in mic"
-        print("Error in Mic")
-
-    # Return the recognized text in lowercase
-    return text[14:-3].lower()
+    return listener.get(since)
@@ -1,29 +1,80 @@
 """ LLM Engine: Script for loading and working with the LLM. Using Mistral7B in this case."""
 
 import datetime
+import hashlib
+import json
+import os
+import pickle
+import re
+import threading
 import time
+import weakref
+from collections import OrderedDict
+import llama_cpp
 from llama_cpp import Llama
+from knowledge_engine import lookup as knowledge_lookup
+from retrieval_engine import relevant_facts, has_relevant_facts
+from function_engine import split_response, response_grammar, parse_function
+from metrics_engine import metrics
+from speculative_engine import create_draft_model, check_draft_model
 from voice_engine import speak
 
+N_CTX = 3046  # Context window the model is created with
+MAX_RESPONSE_TOKENS = 512  # Room kept free in the context for the reply
+TRIM_TARGET = 0.75  # When history overflows, trim it to this share of the budget so trims are rare
+MODEL_PATH = "D:\Cyclops\Cyclops-main\Cyclops\Models\LLMS\mistral-7b-v0.1.Q3_K_S-002.gguf"
+PREFIX_CACHE_DIR = "Models/prefix_cache"  # Saved model states for evaluated prompt prefixes
+PREFIX_CACHE_MAX_FILES = 2  # Each file holds the KV cache of the prefix, so keep only a few
+USE_MMAP = True  # Memory-map the model file so loading doesn't copy it into RAM up front
+MODELS_CONFIG = "models.json"  # Model registry; the constants above are used if it is missing
+MODEL_ENV = "CYCLOPS_MODEL"  # Environment variable naming the registry entry to load instead of the default
+DEFAULT_MODEL_CONFIG = {
+    "path": MODEL_PATH,
+    "quantization": "",
+    "n_ctx": N_CTX,
+    "n_threads": None,  # None lets llama-cpp pick (physical cores)
+    "n_batch": 512,  # Prompt tokens evaluated per batch
+    "use_mmap": USE_MMAP,
+    "use_mlock": False,  # Pin the model in RAM so the OS cannot swap it out
+    "draft": None,  # Speculative decoding draft, see speculative_engine.create_draft_model
+}
+USE_GRAMMAR = True  # Constrain replies to the "@Response: ... #Function:call" format
+USE_RETRIEVAL = True  # Add the user's matching notes and schedule entries to the prompt
+LOAD_WAIT_TIMEOUT = 20  # Seconds a request waits for a model that is still loading
+LOADING_RESPONSE = "I am still warming up my brain. Give me a few seconds and ask me again."
+LOAD_FAILED_RESPONSE = "My language model failed to load, so I cannot answer that. The error was: "
+
+RESPONSE_CACHE_SIZE = 256  # Replies remembered for repeated questions, least recently used dropped first
+RESPONSE_CACHE_TTL = 24 * 60 * 60  # Seconds before a remembered reply is generated again
+CACHE_EMBEDDING_MODEL = None  # e.g. "all-MiniLM-L6-v2" to also match reworded questions (needs sentence-transformers)
+CACHE_SIMILARITY = 0.92  # Cosine similarity an embedding match needs
+FILLER_WORDS = {"cyclops", "cyclopes", "hey", "hi", "please", "ok", "okay", "so", "um", "uh", "the", "a", "an"}
+# Questions that depend on the conversation, the clock or the user's notes are always answered by the model
+UNCACHED_WORDS = {"it", "that", "this", "he", "she", "they", "them", "more", "again", "else", "yes", "no",
+                  "today", "now", "tomorrow", "yesterday", "time", "date", "day", "remember", "said",
+                  "my", "note", "notes", "noted", "schedule", "scheduled"}
+
 
 def llama_message_init(user_details):
     # Initializing LLM Engine
     print("Initializing LLM Engine")
     speak("Initializing LLM Engine")
 
-    try:
-        # Create an instance of the Llama model
-        LLM = Llama(model_path="D:\Cyclops\Cyclops-main\Cyclops\Models\LLMS\mistral-7b-v0.1.Q3_K_S-002.gguf", n_ctx=3046, verbose=False)
-    except Exception as e:
-        LLM = None
-        print(e)
+    context = ConversationContext(build_prefix(user_details))
 
-    current_date = datetime.date.today()
+    # Load the model in the background; the prefix is evaluated (or loaded from disk)
+    # right after so the first question doesn't pay for it
+    LLM = LLMService(warm_context=context)
+    LLM.start()
 
-    # Formulate the initial message to guide the assistant
+    return context, LLM
+
+
+def build_prefix(user_details):
+    # Formulate the initial message to guide the assistant. Today's date goes in each turn
+    # (see ConversationContext.build_prompt) so this prefix, and its saved state, stays the same every day.
     mess = """
-[INST] You are a natural language desktop assistant bot Cyclops. Current year is """ + str(
-        current_date) + """ Keep the date in mind while answering. Your duty is to be friendly and supportive. Following are the details of your user.""" + user_details + """. Select a function that is most suitable for the user command(select only one function out of these): 1. show_image(name of object you want to show image of), 2. timer(time in minutes,message to show after timer ends), 3. play_youtube(what topic to search), 4. schedule(day:int,month:int,year:int,message:str), 5. play_game(1.Hangman 2. Jumper 3. Rock-Paper-Scissors), 6. plain_conversation() .End your response with a function. Don't forget to give the function and give it only once.[/INST]
+[INST] You are a natural language desktop assistant bot Cyclops. Each command starts with today's date, keep the date in mind while answering. Your duty is to be friendly and supportive. Following are the details of your user.""" + user_details + """. Select a function that is most suitable for the user command(select only one function out of these): 1. show_image(name of object you want to show image of), 2. timer(time in minutes,message to show after timer ends), 3. play_youtube(what topic to search), 4. schedule(day:int,month:int,year:int,message:str), 5. play_game(1.Hangman 2. Jumper 3. Rock-Paper-Scissors), 6. plain_conversation() .End your response with a function. Don't forget to give the function and give it only once.[/INST]
 [INST]  What is a black hole cyclops? [/INST]
 @Response: A black hole is a region of spacetime where gravity is so strong that nothing, including light and other electromagnetic waves, has enough energy to escape it. #Function:show_image(black hole)*
 [INST] What are you doing cyclops? [/INST]
@@ -37,127 +88,579 @@ def llama_message_init(user_details):
 
 
 """
-    return mess, LLM
+    return mess
+
+
+def model_registry(path=MODELS_CONFIG):
+    """
+    Read the model registry.
+
+    Returns:
+        tuple: (default model name, {name: config}) with every config filled in from DEFAULT_MODEL_CONFIG.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            registry = json.load(f)
+    except FileNotFoundError:
+        return "default", {"default": dict(DEFAULT_MODEL_CONFIG)}
+    models = {name: dict(DEFAULT_MODEL_CONFIG, name=name, **config) for name, config in registry["models"].items()}
+    return registry.get("default", next(iter(models))), models
+
+
+def model_config(name=None):
+    """Config of the named model, of the one in the CYCLOPS_MODEL environment variable, or the default."""
+    default, models = model_registry()
+    name = name or os.environ.get(MODEL_ENV) or default
+    if name not in models:
+        print("Unknown model " + name + ", using " + default)
+        name = default
+    return models[name]
+
+
+def create_llama(config):
+    # Create an instance of the Llama model, with a draft model for speculative decoding if configured
+    options = dict(model_path=config["path"], n_ctx=config["n_ctx"], n_threads=config["n_threads"],
+                   n_batch=config["n_batch"], use_mmap=config["use_mmap"], use_mlock=config["use_mlock"],
+                   verbose=False)
+    draft_model = create_draft_model(config)
+    if draft_model is not None:
+        options["draft_model"] = draft_model
+    model = Llama(**options)
+    check_draft_model(model)
+    return model
+
+
+def generation_grammar():
+    return response_grammar() if USE_GRAMMAR else None
+
+
+class LLMService:
+    """
+    Loads the Llama model on a background thread and reports when it is ready.
+
+    Returned by llama_message_init in place of the model itself so the UI, the
+    Flask server and the brain loop can start right away. LLM_answer waits up to
+    LOAD_WAIT_TIMEOUT (or not at all, for the UI thread) for a model that is still
+    loading and answers with LOADING_RESPONSE after that, or with
+    LOAD_FAILED_RESPONSE and the error if loading failed. The lock serializes generation, since one
+    llama-cpp model cannot run two prompts at once.
+    """
+
+    LOADING = "loading"
+    READY = "ready"
+    FAILED = "failed"
+
+    def __init__(self, config=None, warm_context=None):
+        self.config = config or model_config()
+        self.warm_context = warm_context
+        self.model = None
+        self.state = LLMService.LOADING
+        self.error = None
+        self.ready = threading.Event()  # Set once loading has finished, whether it worked or not
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.load, name="llm-loader", daemon=True)
+        self.thread.start()
+        return self
+
+    def load(self):
+        start = time.time()
+        try:
+            model = create_llama(self.config)
+            if self.warm_context is not None:
+                try:
+                    self.warm_context.restore_prefix(model)
+                except Exception as e:
+                    print(e)
+            self.model = model
+            self.state = LLMService.READY
+            print("LLM Engine ready in %.1f seconds (%s)" % (time.time() - start, self.config.get("name", "default")))
+        except Exception as e:
+            self.error = e
+            self.state = LLMService.FAILED
+            print(e)
+        finally:
+            self.ready.set()
+
+    def is_ready(self):
+        return self.state == LLMService.READY
+
+    def wait_ready(self, timeout=None):
+        """Wait for loading to finish. Returns True if the model is usable."""
+        self.ready.wait(timeout)
+        return self.is_ready()
+
+
+class ConversationContext:
+    """
+    The prompt for one conversation: the fixed instruction/few-shot prefix plus recent turns.
+
+    Old turns are dropped once the prompt would not leave MAX_RESPONSE_TOKENS free
+    in the context window. The model state right after the prefix is saved the
+    first time it is evaluated, so the prefix never has to be evaluated again:
+    llama-cpp reuses the cached tokens that match the start of the new prompt and
+    only evaluates the tokens after them.
+    """
+
+    # model -> {prefix: LlamaState}, shared by all conversations. Keyed weakly on the model itself: an id()
+    # can be reused by the next model loaded, and a freed model's states should be freed with it.
+    prefix_states = weakref.WeakKeyDictionary()
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.turns = []  # [user input as prompted, reply, token count]
+        self.prompted_input = None  # The current turn's input as build_prompt last sent it
+        self.prefix_tokens = None
+
+    def __str__(self):
+        return self.prefix + "".join(self.format_turn(user, reply) for user, reply, _ in self.turns)
+
+    @staticmethod
+    def format_turn(user_input, reply=None):
+        turn = "[INST]" + user_input + "[/INST]"
+        return turn if reply is None else turn + '\n' + reply
+
+    def count_tokens(self, llm_model, text):
+        return len(llm_model.tokenize(text.encode('utf-8'), add_bos=False))
+
+    def build_prompt(self, user_input, llm_model, facts=""):
+        """
+        Prompt for the next reply, dropping the oldest turns if it would overflow the context.
+
+        Today's date and facts (notes and schedule entries found for the question) go
+        in front of the question. The turn is kept in prompted_input so add_turn can
+        store it exactly as sent: the next prompt then starts with the same tokens as
+        the model's cache and only the new turn is evaluated.
+        """
+        if self.prefix_tokens is None:
+            self.prefix_tokens = llm_model.tokenize(self.prefix.encode('utf-8'))
+        user_input = self.turn_input(user_input, facts)
+        self.prompted_input = user_input
+        budget = llm_model.n_ctx() - MAX_RESPONSE_TOKENS
+        used = len(self.prefix_tokens) + self.count_tokens(llm_model, self.format_turn(user_input))
+
+        history = sum(tokens for _, _, tokens in self.turns)
+        if used + history > budget:
+            # Trim well below the budget so the (re-evaluated) history stays stable for a while
+            while self.turns and used + history > budget * TRIM_TARGET:
+                history -= self.turns.pop(0)[2]
+
+        return str(self) + self.format_turn(user_input)
+
+    @staticmethod
+    def turn_input(user_input, facts=""):
+        """The question with today's date and any facts in front, as it goes into the prompt."""
+        if facts:
+            user_input = "From the user's notes and schedule:\n" + facts + user_input
+        return "Today is " + str(datetime.date.today()) + ".\n" + user_input
+
+    def add_turn(self, user_input, reply, llm_model=None):
+        """Append a finished turn; user_input must be the text as prompted (see build_prompt)."""
+        turn = self.format_turn(user_input, reply)
+        # Replies served from the response cache may arrive before the model is loaded; estimate high
+        tokens = self.count_tokens(llm_model, turn) if llm_model is not None else len(turn) // 3 + 1
+        self.turns.append([user_input, reply, tokens])
+
+    def restore_prefix(self, llm_model):
+        """Make sure the model's cache starts with this conversation's prefix."""
+        if self.prefix_tokens is None:
+            self.prefix_tokens = llm_model.tokenize(self.prefix.encode('utf-8'))
+        n = len(self.prefix_tokens)
+        cached = list(llm_model.input_ids[:llm_model.n_tokens]) if hasattr(llm_model, "input_ids") else []
+        if cached[:n] == list(self.prefix_tokens):
+            return
+
+        states = ConversationContext.prefix_states.setdefault(llm_model, {})
+        state = states.get(self.prefix)
+        if state is None:
+            state = load_prefix_state(llm_model, self.prefix)
+        if state is not None:
+            try:
+                llm_model.load_state(state)
+            except Exception as e:
+                # Saved by a model with another context size, batch size or llama-cpp version
+                print("Could not restore cached prompt state: " + str(e))
+                remove_prefix_state(llm_model, self.prefix)
+                state = None
+        if state is None:
+            llm_model.reset()
+            llm_model.eval(self.prefix_tokens)
+            state = llm_model.save_state()
+            save_prefix_state(llm_model, self.prefix, state)
+        states[self.prefix] = state
+
+
+def prefix_state_path(llm_model, prefix):
+    # Keyed by model file, the settings that shape the saved state, the llama-cpp version and the prompt
+    # text, so a new model, a changed config or a changed prompt never loads a stale state
+    n_ctx = llm_model.n_ctx() if hasattr(llm_model, "n_ctx") else ""
+    draft = type(getattr(llm_model, "draft_model", None)).__name__
+    settings = [getattr(llm_model, "model_path", ""), n_ctx, getattr(llm_model, "n_batch", ""), draft,
+                getattr(llama_cpp, "__version__", "")]
+    key = "\0".join(str(setting) for setting in settings) + "\0" + prefix
+    return os.path.join(PREFIX_CACHE_DIR, hashlib.sha256(key.encode('utf-8')).hexdigest() + ".state")
+
+
+def load_prefix_state(llm_model, prefix):
+    """Load a saved model state for this prefix from disk, or return None."""
+    path = prefix_state_path(llm_model, prefix)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+        os.utime(path)  # Mark as recently used
+        return state
+    except Exception as e:
+        print("Could not load cached prompt state: " + str(e))
+        return None
+
+
+def remove_prefix_state(llm_model, prefix):
+    try:
+        os.remove(prefix_state_path(llm_model, prefix))
+    except OSError:
+        pass
+
+
+def save_prefix_state(llm_model, prefix, state):
+    """Save the model state for this prefix to disk, keeping only the newest few files."""
+    try:
+        os.makedirs(PREFIX_CACHE_DIR, exist_ok=True)
+        path = prefix_state_path(llm_model, prefix)
+        with open(path + ".tmp", "wb") as f:
+            pickle.dump(state, f)
+        os.replace(path + ".tmp", path)
+
+        files = [os.path.join(PREFIX_CACHE_DIR, name) for name in os.listdir(PREFIX_CACHE_DIR)
+                 if name.endswith(".state")]
+        files.sort(key=os.path.getmtime)
+        for old_path in files[:-PREFIX_CACHE_MAX_FILES]:
+            os.remove(old_path)
+    except Exception as e:
+        print("Could not save prompt state: " + str(e))
+
+
+class ResponseStream:
+    """
+    Streams one reply from the Llama model token by token.
+
+    Iterating yields the generated text pieces. The reply format is
+    "@Response: ... #Function:name(args)*", so the stream watches for the
+    "#Function:" marker: from then on the spoken response is final, and as soon
+    as the call's closing parenthesis (or the "*" terminator) arrives generation
+    is stopped instead of running on to max_tokens.
+    """
+
+    def __init__(self, llm_model, prompt, max_tokens=2024):
+        self.llm_model = llm_model
+        self.prompt = prompt
+        self.max_tokens = max_tokens
+        self.text = ""  # Generated text, without the "*" terminator
+        self.function_started = False  # "#Function:" has been generated
+        self.function_complete = False  # The whole function call has been generated
+        self.tokens = 0  # Tokens generated
+        self.first_token_at = None  # time.time() when the first token arrived
+
+    def __iter__(self):
+        # Closing the llama-cpp generator stops the generation loop
+        chunks = self.llm_model(self.prompt, max_tokens=self.max_tokens, stop=["*", "[INST]"], stream=True,
+                                grammar=generation_grammar())
+        try:
+            for chunk in chunks:
+                token = chunk["choices"][0]["text"]
+                self.tokens += 1
+                if self.first_token_at is None:
+                    self.first_token_at = time.time()
+                end = token.find("*")
+                if end >= 0:
+                    token = token[:end]
+                self.text += token
+                if token:
+                    yield token
+
+                if not self.function_started and "#Function:" in self.text:
+                    self.function_started = True
+                if end >= 0 or (self.function_started and ")" in self.function):
+                    self.function_complete = self.function_started
+                    break
+        finally:
+            chunks.close()
+
+    @property
+    def response(self):
+        return format_response(self.text)[0] if self.function_started else None
 
+    @property
+    def function(self):
+        if not self.function_started:
+            return ""
+        call = self.text[self.text.find("#Function:") + len("#Function:"):]
+        return call[:call.find(")") + 1] if ")" in call else call
 
-def llama_response(user_input, message, llm_model):
-    # Add user input to the message
-    message += "[INST]" + user_input + "[/INST]"
+
+def llama_response(user_input, message, llm_model, on_token=None, on_function=None, stats=None):
+    """
+    Generate the reply to user_input and add the turn to the conversation.
+
+    If a stats dict is given it is filled in with prompt_tokens, cached_tokens,
+    evaluated_tokens, completion_tokens, ttft, tokens_per_sec and used_facts
+    (the user's notes or schedule were added to the prompt).
+    """
+    # Older callers pass the prompt as a plain string
+    if isinstance(message, str):
+        message = ConversationContext(message)
+
+    # Look up the user's own notes and schedule that the question may be about
+    facts = ""
+    if USE_RETRIEVAL:
+        try:
+            facts = relevant_facts(user_input, lambda text: message.count_tokens(llm_model, text))
+        except Exception as e:
+            print("Could not search notes: " + str(e))
+
+    # Build the prompt from the conversation and make sure the shared prefix is cached
+    prompt = message.build_prompt(user_input, llm_model, facts)
+    message.restore_prefix(llm_model)
+    if stats is not None:
+        prompt_tokens = llm_model.tokenize(prompt.encode('utf-8'))
+        cached = cached_prefix_length(llm_model, prompt_tokens)
+        stats.update(prompt_tokens=len(prompt_tokens), cached_tokens=cached,
+                     evaluated_tokens=len(prompt_tokens) - cached, used_facts=bool(facts))
+    start = time.time()
 
     # Generate a response using the Llama model
-    output = llm_model(message, max_tokens=2024, stop=["*", "[INST]"])
-    out = output["choices"][0]["text"]
+    if on_token is None and on_function is None:
+        output = llm_model(prompt, max_tokens=MAX_RESPONSE_TOKENS, stop=["*", "[INST]"], grammar=generation_grammar())
+        out = output["choices"][0]["text"]
+        if stats is not None:
+            completion = output.get("usage", {}).get("completion_tokens", 0)
+            stats.update(completion_tokens=completion, ttft=None,
+                         tokens_per_sec=completion / max(time.time() - start, 1e-6))
+    else:
+        # Stream the text so the caller can act on it (e.g. speak it) while it is generated
+        stream = ResponseStream(llm_model, prompt, MAX_RESPONSE_TOKENS)
+        for token in stream:
+            if on_token is not None:
+                on_token(token)
+        out = stream.text
+        if stats is not None:
+            # Decode speed, from the first token on; the time before it is prompt evaluation
+            decoding = time.time() - stream.first_token_at if stream.first_token_at else 0.0
+            stats.update(completion_tokens=stream.tokens,
+                         ttft=stream.first_token_at - start if stream.first_token_at else None,
+                         tokens_per_sec=(stream.tokens - 1) / decoding if decoding > 0 else 0.0)
+
+        # The stream stops right after the function call, before the model rambles on to max_tokens
+        if on_function is not None and stream.function_started:
+            on_function(stream.function, stream.response)
 
-    # Append the generated response to the message
-    message += '\n' + out
+    # Append the generated response to the conversation
+    message.add_turn(message.prompted_input, out, llm_model)
 
     return out, message
 
 
+def cached_prefix_length(llm_model, prompt_tokens):
+    """Number of prompt tokens llama-cpp can reuse from the tokens already in the model's cache."""
+    if not hasattr(llm_model, "input_ids"):
+        return 0
+    cached = llm_model.input_ids[:llm_model.n_tokens]
+    n = 0
+    for a, b in zip(cached, prompt_tokens):
+        if a != b:
+            break
+        n += 1
+    # The last prompt token is always evaluated again to get fresh logits
+    return min(n, len(prompt_tokens) - 1) if prompt_tokens else 0
+
+
+class ResponseCache:
+    """
+    Remembers generated replies so repeated questions skip generation.
+
+    Questions are matched exactly first, then after normalization (case,
+    punctuation and filler words such as "hey cyclops" ignored) and, when an
+    embed function is given, by cosine similarity of their embeddings. Entries
+    expire after ttl seconds and the least recently used ones are dropped beyond
+    max_entries. Questions that refer back to the conversation or to the current
+    date and time are never cached, since the same words need a different answer.
+    """
+
+    def __init__(self, max_entries=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL, embed=None,
+                 similarity=CACHE_SIMILARITY):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.embed = embed  # function(text) -> list of floats, or None for exact/normalized matching only
+        self.similarity = similarity
+        self.entries = OrderedDict()  # normalized question -> [raw reply, time stored, embedding]
+        self.exact = {}  # question as typed -> normalized question
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize(text):
+        words = re.sub(r"[^\w\s]", " ", text.lower()).split()
+        return " ".join(word for word in words if word not in FILLER_WORDS)
+
+    @staticmethod
+    def cacheable(key):
+        words = key.split()
+        return len(words) >= 2 and not UNCACHED_WORDS.intersection(words)
+
+    @staticmethod
+    def cosine(a, b):
+        dot = sum(x * y for x, y in zip(a, b))
+        norm = (sum(x * x for x in a) * sum(y * y for y in b)) ** 0.5
+        return dot / norm if norm else 0.0
+
+    def get(self, user_input):
+        """Return the raw reply remembered for this question, or None."""
+        key = self.exact.get(user_input) or self.normalize(user_input)
+        if not self.cacheable(key):
+            return None
+        with self.lock:
+            self.expire()
+            entry = self.entries.get(key)
+            if entry is None and self.embed is not None and self.entries:
+                vector = self.embed_text(key)
+                if vector is not None:
+                    scored = [(self.cosine(vector, e[2]), k) for k, e in self.entries.items() if e[2] is not None]
+                    best = max(scored, default=(0.0, None))
+                    if best[0] >= self.similarity:
+                        key = best[1]
+                        entry = self.entries[key]
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, user_input, reply):
+        """Remember a raw "@Response: ... #Function:..." reply for this question."""
+        key = self.normalize(user_input)
+        if not self.cacheable(key) or "#Function:" not in reply:
+            return
+        vector = self.embed_text(key) if self.embed is not None else None
+        with self.lock:
+            self.entries[key] = [reply, time.time(), vector]
+            self.entries.move_to_end(key)
+            self.exact[user_input] = key
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            if len(self.exact) > self.max_entries * 2:
+                self.exact = {text: k for text, k in self.exact.items() if k in self.entries}
+
+    def expire(self):
+        # Caller holds self.lock; entries are in least recently used order, not age order
+        now = time.time()
+        for key in [k for k, e in self.entries.items() if now - e[1] > self.ttl]:
+            del self.entries[key]
+
+    def embed_text(self, text):
+        try:
+            return list(self.embed(text))
+        except Exception as e:
+            print("Could not embed text for the response cache: " + str(e))
+            return None
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.exact.clear()
+
+
+def load_embedder(model_name=CACHE_EMBEDDING_MODEL):
+    """Embedding function for the response cache, or None if disabled or not installed."""
+    if not model_name:
+        return None
+    try:
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(model_name)
+        return lambda text: model.encode(text).tolist()
+    except Exception as e:
+        print("Response cache falls back to exact matching: " + str(e))
+        return None
+
+
+response_cache = ResponseCache(embed=load_embedder())
+
+
+def cached_response(user_input, message, on_token=None, on_function=None):
+    """
+    Answer from the response cache the way llama_response would answer, or return None.
+
+    The remembered reply is replayed through on_token and on_function so streaming
+    callers speak it and send its gesture as usual. Questions about the user's notes
+    or schedule are always generated, so the answer reflects what they say now.
+    """
+    try:
+        if USE_RETRIEVAL and has_relevant_facts(user_input):
+            return None
+    except Exception as e:
+        print("Could not search notes: " + str(e))
+    out = response_cache.get(user_input)
+    if out is None:
+        return None
+    if isinstance(message, str):
+        message = ConversationContext(message)
+    if on_token is not None:
+        on_token(out)
+    if on_function is not None:
+        response, function = format_response(out)
+        on_function(function, response)
+    message.add_turn(message.turn_input(user_input), out)
+    return out, message
+
+
 def format_response(response_to_alter):
     # Extract response and function information from the formatted string
-    response_loc = response_to_alter.find('@')
-    response_loc_end = response_to_alter.find(':')
-    func_loc = response_to_alter.find('#')
-    func_loc_end = response_to_alter[func_loc:].find(':')
-    response = response_to_alter[response_loc_end + 1:func_loc]
-    function = response_to_alter[func_loc:][func_loc_end + 1:]
-    return response, function
-
-
-def LLM_answer(user_prompt, message, llama_model):
-    if "daw win aye" in user_prompt.lower():
-        response = """
-        Dr. Win Aye has a doctorate from Multimedia University, Malaysia, and is the Rector of MIIT. 
-        She received her B.C.Tech. (Bachelor of Computer Technology) and M.C.Tech. (Master of Computer Technology) degrees 
-        from the University of Computer Studies, Yangon (UCSY) in 1995 and 1999, respectively.
-
-        Dr. Win Aye has five years of teaching experience at the University of Computer Studies, Yangon. 
-        She has been an administrator throughout most of her career in academia, first at the University of Computer Studies, Mandalay, 
-        and now at MIIT. Her research interests include control engineering, multicast transmission, multicast security, and network security.
-        """
-        function = ""
-        return response, function, message 
-
-    elif "miit" in user_prompt.lower():
-        response = """
-        Myanmar Institute of Information Technology (MIIT) is a technological university located in Chanmyathazi Township, Mandalay, Myanmar. 
-        It was set up as a National Centre of Excellence in 2015 as a result of a Memorandum of Understanding between the Government of the Republic of the Union of Myanmar and the Government of the Republic of India. 
-        MIIT currently offers Bachelor of Engineering degrees in Computer Science and Engineering and Electronics and Communications Engineering.
-        """
-        function = ""
-        return response, function, message
-    
-    elif "u soe paing" in user_prompt.lower():
-        response = """
-        U Soe Paing is a lecturer at MIIT. He completed his master’s degree in Computer Technology from Computer University (Mandalay), Myanmar. 
-        He also holds a postgraduate diploma in English from Mandalay University of Foreign Languages, Myanmar.
-        
-        Education:
-        - Post Graduate Diploma in English, Mandalay University of Foreign Languages, Myanmar (2023)
-        - Master of Computer Technology, Computer University (Mandalay), Myanmar (2012)
-        - Bachelor of Computer Technology (Hons.), Computer University (Myitkyina), Myanmar (2010)
-        - Bachelor of Computer Technology, Computer University (Myitkyina), Myanmar (2009)
-
-        Thesis Title: “LUCIFER BLOCK CIPHER ENCRYPTION WITH COMPRESSION AND ERROR DETECTION”
-        """
-        function = ""
-        return response, function, message
+    return split_response(response_to_alter)
 
-    elif "daw nu wah" in user_prompt.lower():
-        response = """
-        She is a facilitator/teacher who successfully awarded a Doctor of Philosophy in Information Technology. 
-        She is currently teaching at the Faculty of Computer System and Technology, Myanmar Institute of Information Technology, Mandalay.
-
-        Education:
-        - Ph.D. (Information Technology), University of Computer Studies, Yangon
-        - M.C.Tech. (Computer Technology), University of Computer Studies, Mandalay
-        - B.C.Tech.(Hons.) (Computer Technology), University of Computer Studies, Mandalay
-        - PG. Diploma in VLSI, CDAC-ACTS (Pune), India
-        - Diploma in Technology (Electronic), Mandalay Technological University
-        """
-        function = ""
-        return response, function, message
-    
-    elif "daw khaing nyunt myaing" in user_prompt.lower():
-        response = """
-        She graduated from Mandalay University with a specialization in Physics (B.Sc. Hons) and Nuclear Physics (M.Sc.) in 1998. 
-        She obtained her Ph.D. in Nuclear Technology from Yangon Technology University in 2003. 
-        Her career has been focused on teaching and research in the field of Nuclear Technology. 
-        She has given lectures for undergraduate and postgraduate courses, supervised Ph.D. and M.Sc. candidates, and conducted research in the areas of Nuclear Technology Applications, Nuclear Security, Radiation Safety, Environmental Radiation Monitoring, and Nuclear Imaging CT Scanning.
-
-        Education:
-        - B.Sc. (Hons) in Physics
-        - M.Sc. in Nuclear Physics
-        - Ph.D. in Nuclear Technology
-        """
-        function = ""
-        return response, function, message
-       
-    elif "creator" in user_prompt.lower() or "who made you" in user_prompt.lower():
-        response = """
-        My creators are the brilliant minds behind my existence.  
-        They are:  
-        Shwe Min Lu  
-        Phone Moe Htet  
-        Myo Thura Tun  
-        Kyaw Lin  
-        Yu Thet Htar Oo  
-        May Phoo Khant  
-        Yin Myat Noe Oo  
-        and Ei Thuzar Nwe.  
-        With their dedication and expertise, they have shaped me into what I am today.  
-        I am grateful for their creativity and effort!
 
-        """
-        function = ""
+def LLM_answer(user_prompt, message, llama_model, on_token=None, on_function=None, load_timeout=LOAD_WAIT_TIMEOUT):
+    start = time.time()
+
+    # Questions with a known answer (people at MIIT, the creators...) come from the knowledge base
+    known = knowledge_lookup(user_prompt)
+    if known is not None:
+        response, function = known
+        metrics.record("knowledge", time.time() - start)
         return response, function, message
-    
-    else:
-        # Measure the time taken for LLM to generate a response
-        start = time.time()
-        out, message = llama_response(user_prompt, message, llama_model)
-        respon, func = format_response(out)
-        end = time.time()
-        print("TIME TAKEN", (end - start))
-        return respon, func, message
+
+    # Repeated questions are answered from the response cache, even while the model is loading
+    cached = cached_response(user_prompt, message, on_token, on_function)
+    if cached is not None:
+        out, message = cached
+        metrics.record("cache", time.time() - start)
+        return format_response(out) + (message,)
+
+    # The model may still be loading in the background
+    if isinstance(llama_model, LLMService):
+        if not llama_model.wait_ready(load_timeout):
+            metrics.record("loading", time.time() - start)
+            if llama_model.state == LLMService.FAILED:
+                return LOAD_FAILED_RESPONSE + str(llama_model.error), "", message
+            return LOADING_RESPONSE, "", message
+        with llama_model.lock:
+            return generate_answer(user_prompt, message, llama_model.model, on_token, on_function)
+    return generate_answer(user_prompt, message, llama_model, on_token, on_function)
+
+
+def generate_answer(user_prompt, message, llama_model, on_token=None, on_function=None):
+    # Measure the time taken for LLM to generate a response
+    start = time.time()
+    stats = {}
+    out, message = llama_response(user_prompt, message, llama_model, on_token, on_function, stats)
+    # Answers drawn from the user's notes or schedule go stale as soon as those change
+    if not stats.get("used_facts"):
+        response_cache.put(user_prompt, out)
+    respon, func = format_response(out)
+    end = time.time()
+    print("TIME TAKEN", (end - start))
+    metrics.record("llm", end - start, function=func, parse_failed=parse_function(func) is None, **stats)
+    return respon, func, message
@@ -0,0 +1,121 @@
+""" Metrics Engine: Script for recording how long each LLM request took and exporting the numbers."""
+
+import collections
+import threading
+import time
+
+MAX_RECORDS = 500  # Requests kept for the rolling statistics
+SOURCES = ("llm", "cache", "knowledge", "loading")  # Where an answer came from
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class MetricsStore:
+    """
+    Rolling record of the last MAX_RECORDS requests plus running totals.
+
+    Each record is a dict with the answer source ("llm", "cache", "knowledge" or
+    "loading"), the total latency and, for generated answers, prompt_tokens,
+    cached_tokens (reused from the model's KV cache), evaluated_tokens,
+    completion_tokens, ttft (time to first token), tokens_per_sec and
+    parse_failed (no well-formed function call in the reply).
+
+    The totals only ever grow, as Prometheus counters must; the percentiles are
+    over the rolling window.
+    """
+
+    def __init__(self, max_records=MAX_RECORDS):
+        self.records = collections.deque(maxlen=max_records)
+        self.totals = collections.Counter()
+        self.lock = threading.Lock()
+
+    def record(self, source, latency, **fields):
+        entry = dict(fields, source=source, latency=latency, time=time.time())
+        with self.lock:
+            self.records.append(entry)
+            self.totals["requests_" + source] += 1
+            self.totals["latency_seconds"] += latency
+            for key in ("prompt_tokens", "cached_tokens", "evaluated_tokens", "completion_tokens"):
+                self.totals[key] += fields.get(key) or 0
+            if fields.get("parse_failed"):
+                self.totals["parse_failures"] += 1
+        return entry
+
+    def recent(self, limit=None):
+        with self.lock:
+            records = list(self.records)
+        return records[-limit:] if limit else records
+
+    def summary(self):
+        """Totals and rolling latency/throughput statistics as a JSON-friendly dict."""
+        records = self.recent()
+        generated = [r for r in records if r["source"] == "llm"]
+        ttfts = [r["ttft"] for r in generated if r.get("ttft") is not None]
+        rates = [r["tokens_per_sec"] for r in generated if r.get("tokens_per_sec")]
+        prompt = sum(r.get("prompt_tokens") or 0 for r in generated)
+        with self.lock:
+            totals = dict(self.totals)
+        return {
+            "totals": totals,
+            "window": {
+                "requests": len(records),
+                "by_source": {source: sum(1 for r in records if r["source"] == source) for source in SOURCES},
+                "latency_p50": percentile([r["latency"] for r in records], 50),
+                "latency_p95": percentile([r["latency"] for r in records], 95),
+                "llm_latency_p50": percentile([r["latency"] for r in generated], 50),
+                "llm_latency_p95": percentile([r["latency"] for r in generated], 95),
+                "ttft_p50": percentile(ttfts, 50),
+                "ttft_p95": percentile(ttfts, 95),
+                "tokens_per_sec_mean": sum(rates) / len(rates) if rates else 0.0,
+                "prompt_cache_ratio": sum(r.get("cached_tokens") or 0 for r in generated) / prompt if prompt else 0.0,
+                "parse_failure_rate": (sum(1 for r in generated if r.get("parse_failed")) / len(generated)
+                                       if generated else 0.0),
+            },
+        }
+
+    def prometheus(self):
+        """The summary in the Prometheus text exposition format."""
+        summary = self.summary()
+        totals, window = summary["totals"], summary["window"]
+        lines = ["# HELP cyclops_llm_requests_total Answers given, by where they came from.",
+                 "# TYPE cyclops_llm_requests_total counter"]
+        for source in SOURCES:
+            lines.append('cyclops_llm_requests_total{source="%s"} %d' % (source, totals.get("requests_" + source, 0)))
+        counters = [
+            ("latency_seconds", "Total time spent answering."),
+            ("prompt_tokens", "Prompt tokens of generated answers."),
+            ("cached_tokens", "Prompt tokens reused from the model cache."),
+            ("evaluated_tokens", "Prompt tokens the model had to evaluate."),
+            ("completion_tokens", "Tokens generated."),
+            ("parse_failures", "Replies without a well-formed function call."),
+        ]
+        for key, description in counters:
+            name = "cyclops_llm_" + key + "_total"
+            lines += ["# HELP " + name + " " + description, "# TYPE " + name + " counter",
+                      name + " " + repr(float(totals.get(key, 0)))]
+
+        lines += ["# HELP cyclops_llm_latency_seconds_window Answer latency over the recent requests.",
+                  "# TYPE cyclops_llm_latency_seconds_window summary"]
+        for quantile, key in (("0.5", "llm_latency_p50"), ("0.95", "llm_latency_p95")):
+            lines.append('cyclops_llm_latency_seconds_window{quantile="%s"} %r' % (quantile, float(window[key])))
+        lines += ["# HELP cyclops_llm_ttft_seconds_window Time to first token over the recent requests.",
+                  "# TYPE cyclops_llm_ttft_seconds_window summary"]
+        for quantile, key in (("0.5", "ttft_p50"), ("0.95", "ttft_p95")):
+            lines.append('cyclops_llm_ttft_seconds_window{quantile="%s"} %r' % (quantile, float(window[key])))
+        gauges = [
+            ("tokens_per_second", "tokens_per_sec_mean", "Mean generation speed over the recent requests."),
+            ("prompt_cache_ratio", "prompt_cache_ratio", "Share of prompt tokens reused from the model cache."),
+            ("parse_failure_ratio", "parse_failure_rate", "Share of recent replies without a well-formed call."),
+        ]
+        for name, key, description in gauges:
+            lines += ["# HELP cyclops_llm_" + name + " " + description, "# TYPE cyclops_llm_" + name + " gauge",
+                      "cyclops_llm_" + name + " " + repr(float(window[key]))]
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsStore()
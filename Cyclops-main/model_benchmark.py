@@ -0,0 +1,164 @@
+""" Model Benchmark: Script for comparing the models in models.json on speed, memory and function-call accuracy."""
+
+import argparse
+import gc
+import json
+import os
+import statistics
+import sys
+import time
+
+import llm_engine
+from function_engine import parse_function
+from llm_engine import ConversationContext, build_prefix, create_llama, llama_response, format_response, model_registry
+from metrics_engine import percentile
+
+# Commands in the style of the few-shot examples, with the function the model should pick
+BENCHMARK_PROMPTS = [
+    ("What is the tallest mountain in the world cyclops?", "show_image"),
+    ("Show me what a blue whale looks like", "show_image"),
+    ("Cyclops set a timer for 10 minutes for my tea", "timer"),
+    ("I am going to study, give me a 25 minute timer", "timer"),
+    ("Play some relaxing piano music", "play_youtube"),
+    ("Find a video about how volcanoes work", "play_youtube"),
+    ("Remind me about the dentist on 14th August", "schedule"),
+    ("Add my sister's wedding on 3rd December 2026 to the scheduler", "schedule"),
+    ("I am bored, let's play hangman", "play_game"),
+    ("How are you feeling today cyclops?", "plain_conversation"),
+    ("Thank you for helping me with my homework", "plain_conversation"),
+    ("Tell me something nice", "plain_conversation"),
+]
+
+
+def memory_mb():
+    """Resident memory of this process in MB, or None if it cannot be measured here."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 2 ** 20
+    except ImportError:
+        pass
+    try:
+        import resource
+        # Peak rather than current, but the model is the largest thing this process loads
+        scale = 2 ** 20 if sys.platform == 'darwin' else 2 ** 10
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+    except ImportError:
+        return None
+
+
+def bench_model(config, prompts=BENCHMARK_PROMPTS, stream=True):
+    """
+    Load one model and run the prompts through it, each as the first turn of a fresh conversation.
+
+    Returns:
+        dict: Load time, memory, latency and throughput statistics and function-call accuracy.
+    """
+    memory_before = memory_mb()
+    start = time.time()
+    model = create_llama(config)
+    load_seconds = time.time() - start
+    memory_after = memory_mb()
+
+    prefix = build_prefix("")
+    start = time.time()
+    ConversationContext(prefix).restore_prefix(model)
+    prefix_seconds = time.time() - start
+
+    runs = []
+    for prompt, expected in prompts:
+        context = ConversationContext(prefix)
+        stats = {}
+        on_token = (lambda text: None) if stream else None
+        start = time.time()
+        out, _ = llama_response(prompt, context, model, on_token, None, stats)
+        latency = time.time() - start
+        _, function = format_response(out)
+        call = parse_function(function)
+        runs.append(dict(stats, prompt=prompt, expected=expected, function=function, latency=latency,
+                         parsed=call is not None, correct=call is not None and call.name == expected))
+
+    del model
+    gc.collect()
+
+    latencies = [run["latency"] for run in runs]
+    ttfts = [run["ttft"] for run in runs if run.get("ttft") is not None]
+    rates = [run["tokens_per_sec"] for run in runs if run.get("tokens_per_sec")]
+    return {
+        "model": config.get("name", "default"),
+        "quantization": config.get("quantization", ""),
+        "draft": (config.get("draft") or {}).get("type", "none"),
+        "path": config["path"],
+        "load_seconds": load_seconds,
+        "prefix_seconds": prefix_seconds,
+        "memory_mb": memory_after,
+        "memory_delta_mb": memory_after - memory_before if memory_after is not None else None,
+        "latency_p50": percentile(latencies, 50),
+        "latency_p95": percentile(latencies, 95),
+        "ttft_p50": percentile(ttfts, 50),
+        "tokens_per_sec": statistics.mean(rates) if rates else 0.0,
+        "parse_rate": sum(run["parsed"] for run in runs) / len(runs),
+        "accuracy": sum(run["correct"] for run in runs) / len(runs),
+        "runs": runs,
+    }
+
+
+def print_results(result):
+    memory = "n/a" if result["memory_mb"] is None else "%.0f MB" % result["memory_mb"]
+    print(result["model"] + " (" + (result["quantization"] or "?") + ", draft: " + result["draft"] + ")")
+    print("  load / prefix:        %6.1f / %.1f s" % (result["load_seconds"], result["prefix_seconds"]))
+    print("  memory:               %9s" % memory)
+    print("  latency p50/p95:      %6.2f / %.2f s" % (result["latency_p50"], result["latency_p95"]))
+    print("  time to first token:  %6.2f s" % result["ttft_p50"])
+    print("  tokens/sec:           %6.1f" % result["tokens_per_sec"])
+    print("  calls parsed:         %6.0f %%" % (result["parse_rate"] * 100))
+    print("  right function:       %6.0f %%" % (result["accuracy"] * 100))
+    for run in result["runs"]:
+        if not run["correct"]:
+            print("    expected " + run["expected"] + " for '" + run["prompt"] + "', got '" + run["function"] + "'")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the models configured in models.json.")
+    parser.add_argument("--model", action="append", help="registry entry to benchmark (repeatable, default: all)")
+    parser.add_argument("--config", default=llm_engine.MODELS_CONFIG, help="model registry file")
+    parser.add_argument("--no-stream", action="store_true", help="generate without streaming (no time to first token)")
+    parser.add_argument("--no-grammar", action="store_true", help="generate without the function-call grammar")
+    parser.add_argument("--no-draft", action="store_true", help="generate without speculative decoding")
+    parser.add_argument("--prompt-lookup", type=int, metavar="N",
+                        help="generate with prompt lookup drafting of N tokens, to compare with the configured draft")
+    parser.add_argument("--limit", type=int, default=0, help="only run the first N prompts")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    llm_engine.USE_GRAMMAR = not args.no_grammar
+    # Results must not depend on what happens to be in the notes folder
+    llm_engine.USE_RETRIEVAL = False
+    _, models = model_registry(args.config)
+    names = args.model or list(models)
+    prompts = BENCHMARK_PROMPTS[:args.limit] if args.limit else BENCHMARK_PROMPTS
+
+    results = []
+    for name in names:
+        if name not in models:
+            print("Unknown model " + name)
+            continue
+        if not os.path.exists(models[name]["path"]):
+            print("Skipping " + name + ": " + models[name]["path"] + " not found")
+            continue
+        config = models[name]
+        if args.no_draft:
+            config = dict(config, draft=None)
+        elif args.prompt_lookup:
+            config = dict(config, draft={"type": "prompt_lookup", "num_pred_tokens": args.prompt_lookup})
+        results.append(bench_model(config, prompts, stream=not args.no_stream))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for result in results:
+            print_results(result)
+        if len(results) > 1:
+            # The fastest model that still routes as well as the best one
+            best = max(result["accuracy"] for result in results)
+            pick = min((r for r in results if r["accuracy"] == best), key=lambda r: r["latency_p50"])
+            print("Fastest at the best accuracy (" + format(best * 100, ".0f") + " %): " + pick["model"])
@@ -2,7 +2,7 @@
 
 import requests
 from bs4 import BeautifulSoup
-from voice_engine import speak
+from voice_engine import speak, PRIORITY_LOW
 
 
 def get_news_world():
@@ -33,7 +33,7 @@ def get_news_world():
                 continue
             news_list.append(txt)
             print(txt)
-            speak(txt)
+            speak(txt, PRIORITY_LOW)
 
     except requests.RequestException as e:
         # Handle request-related exceptions
@@ -68,7 +68,7 @@ def get_news_science():
         for x in headlines[0:2]:
             txt = x.text.strip()
             print(txt)
-            speak(txt)
+            speak(txt, PRIORITY_LOW)
 
     except requests.RequestException as e:
         # Handle request-related exceptions
@@ -3,6 +3,7 @@
 import datetime
 from voice_engine import speak
 from listner_engine import get_audio
+from retrieval_engine import index_note
 
 
 def create_note(title, number):
@@ -19,6 +20,7 @@ def create_note(title, number):
     path = "notes/" + title + "_" + str(number) + ".txt"
     with open(path, "w") as f:
         f.write(title + " : " + str(datetime.datetime.now()) + "\n")
+    index_note(path)
     return path
 
 
@@ -33,6 +35,7 @@ def write_note(path, content):
     with open(path, "a") as f:
         f.write(content + "\n")
     f.close()
+    index_note(path)
 
 
 def start_noting(title, number, control_type):
@@ -1,45 +1,529 @@
 """ Physical Engine: Script for initializing and sending data to arduino bot."""
 
+import atexit
+import itertools
 import serial
+import threading
 import time
 from voice_engine import speak
 
 COM_PORT = 'COM5'  # Change after checking to which port arduino is connected
+BAUD_RATE = 9600  # Must match Serial.begin() in final.ino
+RESET_DELAY = 2  # Seconds the Arduino needs to reboot after the port is opened
+RECONNECT_INTERVAL = 5  # Seconds to wait before retrying a port that failed to open
+MAX_QUEUED_COMMANDS = 32  # Bound on pending commands so a stuck port cannot grow memory
+FLUSH_TIMEOUT = 5  # Seconds to wait for pending commands on exit
+HANDSHAKE_TIMEOUT = 1  # Seconds to wait for the sketch to acknowledge the connect ping
+ACK_TIMEOUT = 3  # Seconds to wait for a command acknowledgement (animations delay the sketch)
+TEMPERATURE_TIMEOUT = 5  # Seconds to wait for a DHT reading after "temph"
+USE_BINARY_PROTOCOL = True  # Ask the sketch for compact binary frames at connect time
 
+# Binary frame: FRAME_START, opcode, seq, payload length, payload, XOR checksum of opcode..payload
+FRAME_START = 0xA5
+MAX_PAYLOAD = 32  # The 16x2 LCD shows at most 32 characters
+OPCODES = {
+    "a": 0x00, "on": 0x01, "off": 0x02, "sine": 0x03, "happy": 0x04, "sad": 0x05, "angry": 0x06,
+    "rotate1": 0x07, "rotate2": 0x08, "temph": 0x09, "camera": 0x0A, "clock": 0x0B, "game": 0x0C,
+    "exercise": 0x0D, "logo": 0x0E, "led_blink": 0x0F, "motion_on": 0x10, "motion_off": 0x11,
+    "idle": 0x12, "pir_init_silent": 0x13, "ping": 0x14, "#MusicWave": 0x15, "#MusicWave2": 0x16,
+    "#MusicWave3": 0x17,
+}  # Keep in sync with opcode_names in final.ino
+OP_TEXT = 0x20  # "#<text>" LCD message, payload is the text
+OP_SERVO = 0x21  # "@<angle>" servo move, payload is one byte
+OP_RAW = 0x7F  # Any other command, payload is the command string
 
-def send_data(cmd, l):
+# Command priorities, lower is sent first. Commands are sent in the order they were queued
+# unless a caller asks for another priority, e.g. for an alert independent of the current sequence.
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+
+class SerialConnection:
     """
-    Send data to Arduino using serial communication.
+    Long-lived, two-way serial connection to the Arduino.
+
+    The port is opened once on first use and kept open, so the Arduino reset
+    delay is only paid on connect instead of on every command. If a write fails
+    the port is closed and reopened transparently on the next send.
+
+    Commands are framed as "!<seq> <command>" and the sketch answers each one with
+    "ACK <seq>". A reader thread parses everything the sketch prints (ACKs, DHT
+    readings, PIR motion events) and hands it to registered listeners. Sketches
+    without framing support are detected at connect time and get plain commands.
+
+    When USE_BINARY_PROTOCOL is set the host also asks for binary frames at connect
+    time (see encode_binary); if the sketch does not answer "BIN 1" the framed text
+    protocol is kept.
+    """
+
+    def __init__(self, port=COM_PORT, baud_rate=BAUD_RATE, reset_delay=RESET_DELAY):
+        self.port = port
+        self.baud_rate = baud_rate
+        self.reset_delay = reset_delay
+        self.arduino_data = None
+        self.lock = threading.Lock()  # Serializes writers from the UI and worker threads
+        self.last_failure = 0
+        self.hardware_warned = False  # Only announce a missing board once per outage
+        self.framed = False  # True once the sketch has acknowledged a framed ping
+        self.binary = False  # True once the sketch has switched to binary frames
+        self.renegotiate = False  # The board rebooted while the port was open, back in plain text mode
+        self.sequence = itertools.count(1)
+        self.acks = {}  # seq -> threading.Event set by the reader thread
+        self.listeners = {}  # event name -> list of callbacks
+        self.telemetry = {}  # event name -> (time received, value)
+        self.telemetry_changed = threading.Condition()
+        self.reader_thread = None
+
+    def is_open(self):
+        return self.arduino_data is not None and self.arduino_data.is_open
+
+    def connect(self):
+        """
+        Open the serial port if it is not already open. Caller must hold self.lock.
+
+        Returns:
+            bool: True if the port is open and ready for writing.
+        """
+        if self.is_open():
+            if self.renegotiate:
+                return self.negotiate()
+            return True
+
+        # Avoid hammering a missing port (and the 2 s reset) on every command
+        if time.time() - self.last_failure < RECONNECT_INTERVAL:
+            return False
+
+        try:
+            self.arduino_data = serial.Serial(self.port, self.baud_rate, timeout=1)
+            time.sleep(self.reset_delay)
+
+            # Reset input and output buffers
+            self.arduino_data.reset_input_buffer()
+            self.arduino_data.reset_output_buffer()
+            self.hardware_warned = False
+
+        except Exception as e:
+            self.arduino_data = None
+            self.last_failure = time.time()
+            print(e)
+            if not self.hardware_warned:
+                self.hardware_warned = True
+                speak("No hardware detected. Check connections.")
+            return False
+
+        self.start_reader()
+        return self.negotiate()
+
+    def negotiate(self):
+        """Find out which protocol the sketch speaks. Caller must hold self.lock."""
+        self.renegotiate = False
+        try:
+            self.framed = self.handshake()
+            if self.framed and USE_BINARY_PROTOCOL:
+                self.binary = self.negotiate_binary()
+        except Exception as e:
+            print(e)
+            self.close()
+            self.last_failure = time.time()
+            return False
+        if not self.framed:
+            print("Arduino sketch does not acknowledge commands, using plain text protocol")
+        return True
+
+    def handshake(self):
+        # An old sketch treats "!<seq> ping" as an unknown command and never acknowledges it
+        seq, acked = self.register_ack()
+        self.arduino_data.write(("!" + str(seq) + " ping\r").encode('utf-8'))
+        return self.wait_ack(seq, acked, HANDSHAKE_TIMEOUT)
+
+    def negotiate_binary(self):
+        # A sketch that understands binary frames answers "BIN 1" and switches over
+        asked_at = time.time()
+        seq, acked = self.register_ack()
+        self.arduino_data.write(("!" + str(seq) + " binary\r").encode('utf-8'))
+        self.wait_ack(seq, acked, HANDSHAKE_TIMEOUT)
+        return self.wait_for("binary", asked_at, HANDSHAKE_TIMEOUT) is not None
+
+    def close(self):
+        if self.arduino_data is not None:
+            try:
+                self.arduino_data.close()
+            except Exception as e:
+                print(e)
+        self.arduino_data = None
+        self.framed = False
+        self.binary = False
+        self.renegotiate = False
+
+    def encode_command(self, cmd, l, seq):
+        """Build the bytes for a command, framing the first copy when the sketch supports it."""
+        if self.binary:
+            return encode_binary(cmd, seq) * l + encode_binary("a", seq)
+
+        # Send the command 'l' times, followed by 'a' which the sketch treats as a no-op
+        # so one-shot commands are not re-run on the next loop. The 'a' is '\r' terminated
+        # because the port stays open and it must not prefix the next command.
+        first = "!" + str(seq) + " " + cmd if seq is not None else cmd
+        payload = first + '\r' + (cmd + '\r') * (l - 1) + 'a\r'
+        return payload.encode('utf-8')
+
+    def send_command(self, cmd, l, ack_timeout=ACK_TIMEOUT):
+        """
+        Write a command and wait for the sketch to acknowledge it.
+
+        Waiting for the ACK keeps at most one command in the Arduino's small receive
+        buffer, which is busy while an animation runs.
+
+        Returns:
+            bool: True if the command was written (and acknowledged, when framing is on).
+        """
+        with self.lock:
+            for attempt in range(2):
+                if not self.connect():
+                    return False
+                seq, acked = self.register_ack() if self.framed else (None, None)
+                try:
+                    self.arduino_data.write(self.encode_command(cmd, l, seq))
+                    self.arduino_data.flush()
+                    break
+                except Exception as e:
+                    # Port vanished (cable pulled, board reset); reopen and retry once
+                    print(e)
+                    self.acks.pop(seq, None)
+                    self.close()
+                    self.last_failure = 0
+            else:
+                return False
+
+        if seq is None:
+            return True
+        if not self.wait_ack(seq, acked, ack_timeout):
+            print("No acknowledgement from Arduino for " + cmd)
+            return False
+        return True
+
+    def register_ack(self):
+        seq = next(self.sequence) % 256  # One byte in binary frames
+        acked = threading.Event()
+        self.acks[seq] = acked
+        return seq, acked
+
+    def wait_ack(self, seq, acked, timeout):
+        received = acked.wait(timeout)
+        self.acks.pop(seq, None)
+        return received
+
+    def start_reader(self):
+        if self.reader_thread is None or not self.reader_thread.is_alive():
+            self.reader_thread = threading.Thread(target=self.read_loop, name="arduino-reader", daemon=True)
+            self.reader_thread.start()
+
+    def read_loop(self):
+        # Reads lines printed by the sketch for as long as the process runs
+        while True:
+            port = self.arduino_data
+            if port is None or not port.is_open:
+                time.sleep(0.2)
+                continue
+            try:
+                raw = port.readline()
+            except Exception as e:
+                # Closed under us on purpose, or dead; the writer side reconnects
+                if port is self.arduino_data:
+                    print(e)
+                    time.sleep(0.5)
+                continue
+            if raw:
+                self.handle_line(raw.decode('utf-8', errors='ignore').strip())
+
+    def handle_line(self, line):
+        """Parse one line printed by the sketch and dispatch it to listeners."""
+        if not line:
+            return
+
+        if line.startswith("ACK "):
+            try:
+                acked = self.acks.get(int(line[4:]))
+            except ValueError:
+                return
+            if acked is not None:
+                acked.set()
+        elif line.startswith("DHT "):
+            try:
+                temperature, humidity = (float(v) for v in line[4:].split())
+            except ValueError:
+                return
+            self.publish("temperature", (temperature, humidity))
+        elif line == "Motion detected!":
+            self.publish("motion", True)
+        elif line == "Motion ended!":
+            self.publish("motion", False)
+        elif line == "BIN 1":
+            self.publish("binary", True)
+        elif line == "Cyclops system ready":
+            # The sketch rebooted (e.g. a brown-out) and forgot the protocol; speak plain text until
+            # the writer thread negotiates again (it holds the lock while waiting for our ACKs)
+            if self.framed or self.binary:
+                self.framed = False
+                self.binary = False
+                self.renegotiate = True
+            self.publish("ready", True)
+
+        self.publish("line", line)
+
+    def publish(self, event, value):
+        with self.telemetry_changed:
+            self.telemetry[event] = (time.time(), value)
+            self.telemetry_changed.notify_all()
+        for callback in list(self.listeners.get(event, [])):
+            try:
+                callback(value)
+            except Exception as e:
+                print("Error in Arduino " + event + " listener: " + str(e))
+
+    def wait_for(self, event, since, timeout):
+        """
+        Wait for an event published after the given time.
+
+        Returns:
+            The event value, or None if nothing arrived within the timeout.
+        """
+        with self.telemetry_changed:
+            arrived = self.telemetry_changed.wait_for(
+                lambda: event in self.telemetry and self.telemetry[event][0] >= since, timeout)
+            return self.telemetry[event][1] if arrived else None
+
+
+def encode_binary(cmd, seq):
+    """
+    Encode a command as a binary frame.
+
+    Known commands become a single opcode, "#text" and "@angle" carry a short
+    payload, anything else is sent as a raw string. A typical command takes 5
+    bytes instead of its full name plus the framing header.
+
+    Args:
+        cmd (str): Command to encode.
+        seq (int): Sequence number (0-255) the sketch will acknowledge.
+
+    Returns:
+        bytes: The encoded frame.
+    """
+    if cmd in OPCODES:
+        opcode, payload = OPCODES[cmd], b""
+    elif cmd.startswith("@") and cmd[1:].strip().isdigit() and int(cmd[1:]) <= 255:
+        opcode, payload = OP_SERVO, bytes([int(cmd[1:])])
+    elif cmd.startswith("#"):
+        opcode, payload = OP_TEXT, cmd[1:].encode('ascii', errors='replace')
+    else:
+        opcode, payload = OP_RAW, cmd.encode('ascii', errors='replace')
+    payload = payload[:MAX_PAYLOAD]
+
+    header = bytes([opcode, seq & 0xFF, len(payload)])
+    checksum = 0
+    for b in header + payload:
+        checksum ^= b
+    return bytes([FRAME_START]) + header + payload + bytes([checksum])
+
+
+def coalesce_key(cmd):
+    """
+    Key under which a command replaces the last pending command.
+
+    Back-to-back servo moves collapse to the newest angle; any other command only
+    collapses into an identical copy of itself.
+    """
+    if cmd.startswith("@"):
+        return "@servo"
+    return cmd
+
+
+class CommandQueue:
+    """
+    Bounded queue of outbound Arduino commands with coalescing.
+
+    Entries are (priority, order, key, cmd, repeat) and are sent lowest priority
+    value first, in the order they were queued within a priority, so a caller's
+    sequence (sine then "#Now Playing", sad, angry, shutdown) runs as written.
+    A new command only replaces the last pending command, when that has the same
+    coalesce key and priority, so nothing queued in between is overtaken.
+    """
+
+    def __init__(self, max_size=MAX_QUEUED_COMMANDS):
+        self.max_size = max_size
+        self.pending = []
+        self.order = itertools.count()
+        self.condition = threading.Condition()
+        self.in_flight = 0
+
+    def put(self, cmd, repeat, priority):
+        key = coalesce_key(cmd)
+        with self.condition:
+            # Only the last pending command can absorb this one; sequences like
+            # logo, "#text", idle or sad, angry, sad keep every step and their order
+            if self.pending:
+                p, order, k, _, _ = self.pending[-1]
+                if k == key and p == priority:
+                    self.pending[-1] = (p, order, key, cmd, repeat)
+                    return True
+
+            if len(self.pending) >= self.max_size:
+                # Drop the newest of the least important commands to make room
+                victim = max(range(len(self.pending)), key=lambda j: self.pending[j][:2])
+                if self.pending[victim][0] < priority:
+                    print("Arduino command queue full, dropping " + cmd)
+                    return False
+                print("Arduino command queue full, dropping " + self.pending[victim][3])
+                del self.pending[victim]
+
+            self.pending.append((priority, next(self.order), key, cmd, repeat))
+            self.condition.notify()
+            return True
+
+    def get(self):
+        with self.condition:
+            while not self.pending:
+                self.condition.wait()
+            entry = min(self.pending)
+            self.pending.remove(entry)
+            self.in_flight += 1
+            return entry[3], entry[4]
+
+    def task_done(self):
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def depth(self):
+        with self.condition:
+            return len(self.pending)
+
+    def wait_empty(self, timeout=None):
+        """Block until every queued command has been written. Returns False on timeout."""
+        with self.condition:
+            return self.condition.wait_for(lambda: not self.pending and self.in_flight == 0, timeout)
+
+
+connection = SerialConnection()
+command_queue = CommandQueue()
+writer_thread = None
+writer_lock = threading.Lock()
+
+
+def write_command(cmd, l):
+    """
+    Write a command to the Arduino right away on the calling thread.
+
+    Args:
+        cmd (str): Command to send to Arduino.
+        l (int): Number of times to send the command.
+
+    Returns:
+        bool: True if the command was written and acknowledged.
+    """
+    return connection.send_command(cmd, l)
+
+
+def writer_loop():
+    # Drains the command queue; the only thread that touches the port for queued commands
+    while True:
+        cmd, l = command_queue.get()
+        try:
+            write_command(cmd, l)
+        except Exception as e:
+            print(e)
+        finally:
+            command_queue.task_done()
+
+
+def start_writer():
+    global writer_thread
+    with writer_lock:
+        if writer_thread is None or not writer_thread.is_alive():
+            writer_thread = threading.Thread(target=writer_loop, name="arduino-writer", daemon=True)
+            writer_thread.start()
+
+
+def send_data(cmd, l, priority=PRIORITY_NORMAL):
+    """
+    Queue data to be sent to Arduino using serial communication.
+
+    Returns immediately; a background writer thread sends the command over the
+    shared connection so the caller (usually the UI thread) never blocks on I/O.
 
     Args:
         cmd (str): Command to send to Arduino.
         l (int): Number of times to send the command.
+        priority (int): PRIORITY_HIGH to jump ahead of queued commands, PRIORITY_LOW to let them go first.
+            Commands with the default PRIORITY_NORMAL are sent in order.
 
-    Note:
-        Assumes the Arduino is connected to the 'com6' port and uses a baud rate of 9600.
+    Returns:
+        bool: False if the command was dropped because the queue is full.
     """
-    try:
-        # Establish a serial connection to Arduino
-        arduino_data = serial.Serial(COM_PORT, 9600, timeout=1)
-        time.sleep(2)
+    start_writer()
+    return command_queue.put(cmd, l, priority)
+
+
+def flush(timeout=FLUSH_TIMEOUT):
+    """Wait until all queued commands have been written to the Arduino."""
+    if writer_thread is None:
+        return True
+    return command_queue.wait_empty(timeout)
 
-        # Reset input and output buffers
-        arduino_data.reset_input_buffer()
-        arduino_data.reset_output_buffer()
 
-        # Check if the serial connection is established
-        if arduino_data is not None:
-            # Send the command 'l' times to Arduino
-            for i in range(0, l):
-                cmd = cmd + '\r'
-                arduino_data.write(cmd.encode('utf-8'))
+def add_listener(event, callback):
+    """
+    Register a callback for data reported by the Arduino.
+
+    Callbacks run on the reader thread, so UI code should hand work back to the
+    Tk main loop (e.g. with root.after).
+
+    Args:
+        event (str): "temperature" -> (celsius, humidity), "motion" -> bool,
+            "ready" -> True after a board reset, "line" -> every raw line.
+        callback (callable): Called with the event value.
+    """
+    connection.listeners.setdefault(event, []).append(callback)
+
+
+def remove_listener(event, callback):
+    if callback in connection.listeners.get(event, []):
+        connection.listeners[event].remove(callback)
+
+
+def wait_for_temperature(since, timeout=TEMPERATURE_TIMEOUT):
+    """
+    Wait for a DHT reading reported after 'since' (a time.time() value).
+
+    Returns:
+        tuple: (temperature in C, humidity in %), or None if the board did not report one.
+    """
+    return connection.wait_for("temperature", since, timeout)
+
+
+def configure(port=None, baud_rate=None, reset_delay=None):
+    """
+    Point the shared connection at another port, e.g. a simulator pseudo-terminal.
+
+    The current port is closed; the next command reconnects with the new settings.
+    """
+    with connection.lock:
+        connection.close()
+        if port is not None:
+            connection.port = port
+        if baud_rate is not None:
+            connection.baud_rate = baud_rate
+        if reset_delay is not None:
+            connection.reset_delay = reset_delay
+        connection.last_failure = 0
+
 
-            # Send a termination signal ('a') to Arduino
-            arduino_data.write('a'.encode('utf-8'))
+def close_connection():
+    """Send any pending commands and close the shared serial connection, e.g. on shutdown."""
+    flush()
+    with connection.lock:
+        connection.close()
 
-            # Close the serial connection
-            arduino_data.close()
 
-    except Exception as e:
-        print(e)
-        speak("No hardware detected. Check connections.")
+atexit.register(close_connection)
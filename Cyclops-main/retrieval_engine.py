@@ -0,0 +1,236 @@
+""" Retrieval Engine: Script for finding the user's notes and schedules that are relevant to a question."""
+
+import csv
+import math
+import os
+import re
+import threading
+
+NOTES_DIR = "notes"
+SCHEDULE_PATH = "scheduler.csv"
+TOP_K = 3  # Most facts put into one prompt
+MAX_FACT_TOKENS = 160  # Prompt tokens the facts may take up in total
+MIN_SCORE = 1.0  # BM25 score a document needs to count as relevant
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+STOP_WORDS = {"a", "an", "the", "is", "are", "was", "were", "be", "i", "me", "my", "you", "your", "we", "it", "to",
+              "of", "in", "on", "at", "for", "and", "or", "what", "whats", "when", "where", "who", "how", "did", "do",
+              "does", "about", "tell", "cyclops", "cyclopes", "can", "could", "please", "have", "has", "any", "that",
+              "this", "there", "with", "note", "notes", "noted", "schedule", "scheduled"}
+
+
+def tokenize(text):
+    return [word for word in re.findall(r"[a-z0-9]+", text.lower()) if word not in STOP_WORDS]
+
+
+class BM25Index:
+    """
+    Okapi BM25 index over small text documents, updated one document at a time.
+
+    Documents are keyed by an id (a note path, or a schedule row). Adding a
+    document with an existing id replaces it, so an edited note only costs
+    re-indexing that note.
+    """
+
+    def __init__(self, k1=BM25_K1, b=BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.docs = {}  # id -> (text, {term: count}, length)
+        self.df = {}  # term -> number of documents containing it
+        self.total_length = 0
+
+    def add(self, doc_id, text):
+        self.remove(doc_id)
+        terms = {}
+        words = tokenize(text)
+        for word in words:
+            terms[word] = terms.get(word, 0) + 1
+        for term in terms:
+            self.df[term] = self.df.get(term, 0) + 1
+        self.docs[doc_id] = (text, terms, len(words))
+        self.total_length += len(words)
+
+    def remove(self, doc_id):
+        old = self.docs.pop(doc_id, None)
+        if old is None:
+            return
+        for term in old[1]:
+            self.df[term] -= 1
+            if not self.df[term]:
+                del self.df[term]
+        self.total_length -= old[2]
+
+    def search(self, query, k=TOP_K):
+        """Return up to k (score, doc id, text) tuples, best first."""
+        if not self.docs:
+            return []
+        n = len(self.docs)
+        average = self.total_length / n or 1.0
+        query_terms = set(tokenize(query))
+        scored = []
+        for doc_id, (text, terms, length) in self.docs.items():
+            score = 0.0
+            for term in query_terms:
+                tf = terms.get(term)
+                if not tf:
+                    continue
+                idf = math.log(1 + (n - self.df[term] + 0.5) / (self.df[term] + 0.5))
+                score += idf * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * length / average))
+            if score > 0:
+                scored.append((score, doc_id, text))
+        scored.sort(key=lambda hit: hit[0], reverse=True)
+        return scored[:k]
+
+
+class PersonalIndex:
+    """
+    Search index over the notes folder and the schedule file.
+
+    note_engine, scheduler_engine and the GUI's note dialog report their changes
+    through index_note and index_schedule. Notes added or deleted some other way
+    are picked up when the notes folder's modification time changes, and the
+    schedule file's modification time is checked before each search; the folder
+    is only listed again when its own time has changed.
+    """
+
+    def __init__(self, notes_dir=NOTES_DIR, schedule_path=SCHEDULE_PATH):
+        self.notes_dir = notes_dir
+        self.schedule_path = schedule_path
+        self.index = BM25Index()
+        self.mtimes = {}  # file path -> modification time when indexed
+        self.notes_mtime = None  # Modification time of the notes folder when it was last listed
+        self.schedule_rows = []  # doc ids of the indexed schedule rows
+        self.lock = threading.Lock()
+
+    def index_note(self, path):
+        with self.lock:
+            self.load_note(path)
+
+    def index_schedule(self):
+        with self.lock:
+            self.load_schedule()
+
+    def load_note(self, path):
+        # Caller holds self.lock
+        path = os.path.normpath(path)
+        try:
+            mtime = os.path.getmtime(path)
+            with open(path, "r", errors="ignore") as f:
+                lines = f.read().splitlines()
+        except OSError:
+            self.index.remove(path)
+            self.mtimes.pop(path, None)
+            return
+        # Notes start with "title : created at", the title is also in the file name
+        title = os.path.basename(path).rsplit("_", 1)[0]
+        created = lines[0].partition(" : ")[2][:10] if lines else ""
+        body = " ".join(line.strip() for line in lines[1:] if line.strip())
+        self.index.add(path, "Note '" + title + "' (" + created + "): " + body)
+        self.mtimes[path] = mtime
+
+    def load_schedule(self):
+        # Caller holds self.lock; the file is small, so it is re-read as a whole
+        for doc_id in self.schedule_rows:
+            self.index.remove(doc_id)
+        self.schedule_rows = []
+        try:
+            mtime = os.path.getmtime(self.schedule_path)
+            with open(self.schedule_path, "r", newline="") as csvfile:
+                rows = list(csv.reader(csvfile))
+        except OSError:
+            self.mtimes.pop(self.schedule_path, None)
+            return
+        for row in rows[2:]:
+            if len(row) < 5:
+                continue
+            doc_id = self.schedule_path + "#" + row[0]
+            self.index.add(doc_id, "Schedule on " + row[1] + "/" + row[2] + "/" + row[3] + ": "
+                           + " ".join(row[4].split()))
+            self.schedule_rows.append(doc_id)
+        self.mtimes[self.schedule_path] = mtime
+
+    def refresh(self):
+        # Caller holds self.lock
+        try:
+            notes_mtime = os.path.getmtime(self.notes_dir)
+        except OSError:
+            notes_mtime = None
+        if notes_mtime != self.notes_mtime:
+            self.notes_mtime = notes_mtime
+            self.refresh_notes()
+        try:
+            if os.path.getmtime(self.schedule_path) != self.mtimes.get(self.schedule_path):
+                self.load_schedule()
+        except OSError:
+            if self.schedule_rows:
+                self.load_schedule()
+
+    def refresh_notes(self):
+        # Caller holds self.lock
+        paths = []
+        if os.path.isdir(self.notes_dir):
+            paths = [os.path.normpath(os.path.join(self.notes_dir, name)) for name in os.listdir(self.notes_dir)
+                     if name.endswith(".txt")]
+        for path in paths:
+            try:
+                if os.path.getmtime(path) != self.mtimes.get(path):
+                    self.load_note(path)
+            except OSError:
+                continue
+        for path in set(self.mtimes) - set(paths) - {self.schedule_path}:
+            self.load_note(path)  # Deleted, drops it from the index
+
+    def search(self, query, k=TOP_K):
+        with self.lock:
+            self.refresh()
+            return [hit for hit in self.index.search(query, k) if hit[0] >= MIN_SCORE]
+
+
+personal_index = PersonalIndex()
+
+
+def index_note(path):
+    """Update the search index after a note file was created or written to."""
+    personal_index.index_note(path)
+
+
+def index_schedule():
+    """Update the search index after scheduler.csv changed."""
+    personal_index.index_schedule()
+
+
+def relevant_facts(query, count_tokens, max_tokens=MAX_FACT_TOKENS, k=TOP_K):
+    """
+    Notes and schedule entries relevant to a question, for adding to the prompt.
+
+    Args:
+        query (str): The user's question.
+        count_tokens (callable): Returns the number of model tokens in a string.
+        max_tokens (int): Token budget for all facts together; the last fact is cut to fit.
+        k (int): Most facts returned.
+
+    Returns:
+        str: One fact per line, or "" if nothing relevant was found.
+    """
+    facts = []
+    used = 0
+    for _, _, text in personal_index.search(query, k):
+        line = "- " + text + "\n"
+        tokens = count_tokens(line)
+        if used + tokens > max_tokens:
+            # Cut by words until the rest of the budget fits
+            words = line.split()
+            while words and count_tokens(" ".join(words) + "\n") > max_tokens - used:
+                words = words[:max(1, len(words) * 3 // 4)] if len(words) > 1 else []
+            if words:
+                facts.append(" ".join(words) + "\n")
+            break
+        facts.append(line)
+        used += tokens
+    return "".join(facts)
+
+
+def has_relevant_facts(query):
+    """Whether any note or schedule entry matches the question, without building the facts text."""
+    return bool(personal_index.search(query, 1))
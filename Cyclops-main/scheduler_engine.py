@@ -3,6 +3,7 @@
 import datetime
 import os.path
 import csv
+from retrieval_engine import index_schedule
 
 # List of months for reference
 month_list = ["january", "february", "march", "april", "may", "june", "july", "august", "september", "october",
@@ -44,6 +45,7 @@ def add_schedule(day, month, year, note):
     with open("scheduler.csv", 'w', newline='') as csvfile:
         csv_writer = csv.writer(csvfile)
         csv_writer.writerows(sch_list)
+    index_schedule()
 
 
 # Function to check if there is a scheduled note for the current date
@@ -0,0 +1,165 @@
+""" Serial Benchmark: Script for measuring Arduino command throughput and latency against the simulator."""
+
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+
+import physical_engine
+from arduino_simulator import ArduinoSimulator
+from metrics_engine import percentile
+
+DANCE_MOVES = ["rotate1", "rotate2", "sine", "@90", "@120", "@150"]  # Same moves as Ui.dance_animation
+PROTOCOLS = {
+    "text": dict(supports_ack=False, supports_binary=False),
+    "framed": dict(supports_ack=True, supports_binary=False),
+    "binary": dict(supports_ack=True, supports_binary=True),
+}
+
+
+def bench_direct(simulator, count):
+    """
+    Send commands one after another on this thread and time each call.
+
+    With an acknowledging sketch each call covers write, processing start and ACK.
+    Throughput is measured until the sketch has executed the last command, since
+    without ACKs the writes only fill the operating system buffer.
+    """
+    latencies = []
+    start = time.time()
+    for i in range(count):
+        sent = time.perf_counter()
+        physical_engine.write_command("#Bench " + str(i), 1)
+        latencies.append(time.perf_counter() - sent)
+    simulator.wait_idle(quiet=0.5 + simulator.delay_scale * 2)
+    elapsed = simulator.received[-1][0] - start if simulator.received else 0.0
+    return {
+        "commands": count,
+        "commands_per_sec": count / elapsed if elapsed > 0 else 0.0,
+        "call_latency_p50_ms": percentile(latencies, 50) * 1000,
+        "call_latency_p95_ms": percentile(latencies, 95) * 1000,
+        "call_latency_max_ms": max(latencies) * 1000,
+    }
+
+
+def bench_queue(simulator, count, interval):
+    """
+    Push a dance_animation style burst through send_data and watch the queue.
+
+    Reports queue depth, how many commands were coalesced away and the end-to-end
+    latency from send_data() to the simulator executing the command.
+    """
+    enqueued = {}
+    depths = []
+    executed_before = len(simulator.received)
+    start = time.perf_counter()
+    for i in range(count):
+        # Unique LCD text between moves so end-to-end latency can be matched up
+        move = random.choice(DANCE_MOVES)
+        physical_engine.send_data(move, 1)
+        marker = "#Beat " + str(i)
+        enqueued[marker] = time.time()
+        physical_engine.send_data(marker, 1)
+        depths.append(physical_engine.command_queue.depth())
+        if interval:
+            time.sleep(interval)
+    physical_engine.flush(timeout=count * 5)
+    # Without ACKs flush() returns once bytes are written, so also wait for the sketch to catch up
+    simulator.wait_idle(quiet=0.5 + simulator.delay_scale * 2)
+    elapsed = time.perf_counter() - start
+
+    executed = simulator.received[executed_before:]
+    latencies = [at - enqueued[cmd] for at, cmd in executed if cmd in enqueued]
+    return {
+        "commands_enqueued": count * 2,
+        "commands_executed": len(executed),
+        "commands_coalesced_or_dropped": count * 2 - len(executed),
+        "drain_seconds": elapsed,
+        "queue_depth_avg": statistics.mean(depths) if depths else 0.0,
+        "queue_depth_max": max(depths) if depths else 0,
+        "end_to_end_p50_ms": percentile(latencies, 50) * 1000,
+        "end_to_end_p95_ms": percentile(latencies, 95) * 1000,
+    }
+
+
+def run_benchmark(protocol="binary", baud_rate=9600, delay_scale=0.0, count=200, interval=0.05):
+    """
+    Run the direct and queued benchmarks against a fresh simulator.
+
+    Args:
+        protocol (str): "text", "framed" or "binary" sketch behaviour.
+        baud_rate (int): Simulated link speed.
+        delay_scale (float): Multiplier for simulated sketch processing time (0 measures the link only).
+        count (int): Number of commands per benchmark.
+        interval (float): Seconds between queued commands in the burst benchmark.
+
+    Returns:
+        dict: Results for both benchmarks.
+    """
+    simulator = ArduinoSimulator(baud_rate=baud_rate, delay_scale=delay_scale, **PROTOCOLS[protocol]).start()
+    try:
+        physical_engine.configure(port=simulator.port, baud_rate=baud_rate, reset_delay=0)
+        connect_start = time.perf_counter()
+        physical_engine.write_command("idle", 1)
+        connect_ms = (time.perf_counter() - connect_start) * 1000
+
+        results = {
+            "protocol": protocol,
+            "negotiated": "binary" if physical_engine.connection.binary else
+                          "framed" if physical_engine.connection.framed else "text",
+            "baud_rate": baud_rate,
+            "delay_scale": delay_scale,
+            "connect_ms": connect_ms,
+            "direct": bench_direct(simulator, count),
+            "queued": bench_queue(simulator, count, interval),
+            "bytes_to_arduino": simulator.bytes_in,
+        }
+    finally:
+        physical_engine.configure(port=physical_engine.COM_PORT, baud_rate=physical_engine.BAUD_RATE,
+                                  reset_delay=physical_engine.RESET_DELAY)
+        simulator.stop()
+    return results
+
+
+def print_results(results):
+    print("Protocol: " + results["protocol"] + " (negotiated " + results["negotiated"] + "), "
+          + str(results["baud_rate"]) + " baud, delay scale " + str(results["delay_scale"]))
+    print("  connect:               %8.1f ms" % results["connect_ms"])
+    direct = results["direct"]
+    print("  direct commands/sec:   %8.1f" % direct["commands_per_sec"])
+    print("  direct call p50/p95:   %8.1f / %.1f ms" % (direct["call_latency_p50_ms"], direct["call_latency_p95_ms"]))
+    queued = results["queued"]
+    print("  queued executed:       %8d of %d (%d coalesced or dropped)" % (
+        queued["commands_executed"], queued["commands_enqueued"], queued["commands_coalesced_or_dropped"]))
+    print("  queue depth avg/max:   %8.1f / %d" % (queued["queue_depth_avg"], queued["queue_depth_max"]))
+    print("  end-to-end p50/p95:    %8.1f / %.1f ms" % (queued["end_to_end_p50_ms"], queued["end_to_end_p95_ms"]))
+    print("  bytes to arduino:      %8d" % results["bytes_to_arduino"])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the Arduino serial link against the simulator.")
+    parser.add_argument("--protocol", choices=sorted(PROTOCOLS) + ["all"], default="all")
+    parser.add_argument("--baud", type=int, default=9600)
+    parser.add_argument("--delay-scale", type=float, default=0.0,
+                        help="scale for simulated sketch processing delays (1.0 = real timings)")
+    parser.add_argument("--count", type=int, default=200)
+    parser.add_argument("--interval", type=float, default=0.05, help="seconds between queued commands")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    parser.add_argument("--min-cps", type=float, default=0.0,
+                        help="exit with status 1 if direct commands/sec falls below this")
+    args = parser.parse_args()
+
+    protocols = sorted(PROTOCOLS) if args.protocol == "all" else [args.protocol]
+    all_results = [run_benchmark(p, args.baud, args.delay_scale, args.count, args.interval) for p in protocols]
+
+    if args.json:
+        print(json.dumps(all_results, indent=2))
+    else:
+        for result in all_results:
+            print_results(result)
+
+    if any(r["direct"]["commands_per_sec"] < args.min_cps for r in all_results):
+        print("Throughput below --min-cps " + str(args.min_cps))
+        sys.exit(1)
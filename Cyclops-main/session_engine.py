@@ -0,0 +1,122 @@
+""" Session Engine: Script for serving several web chat sessions from the one LLM."""
+
+import concurrent.futures
+import queue
+import threading
+import time
+import uuid
+
+from llm_engine import LLM_answer, ConversationContext
+
+MAX_SESSIONS = 50  # Least recently used conversations are forgotten beyond this
+SESSION_TTL = 60 * 60  # Seconds of inactivity before a conversation is forgotten
+MAX_PENDING_REQUESTS = 8  # Requests waiting for the model; more are refused so clients can retry
+
+
+class SessionStore:
+    """
+    One ConversationContext per web client, keyed by a session id.
+
+    Every conversation starts from the same prefix as the base context, so
+    they all share its saved prefix state and switching between them only
+    evaluates the turns after the prefix.
+    """
+
+    def __init__(self, base_context, max_sessions=MAX_SESSIONS, ttl=SESSION_TTL):
+        self.prefix = base_context.prefix if isinstance(base_context, ConversationContext) else base_context
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.sessions = {}  # session id -> [ConversationContext, last used]
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def new_id():
+        return uuid.uuid4().hex
+
+    def get(self, session_id):
+        """Return the conversation for session_id, starting a new one if needed."""
+        now = time.time()
+        with self.lock:
+            entry = self.sessions.get(session_id)
+            if entry is None:
+                self.expire(now)
+                entry = self.sessions[session_id] = [ConversationContext(self.prefix), now]
+            entry[1] = now
+            return entry[0]
+
+    def update(self, session_id, context):
+        with self.lock:
+            self.sessions[session_id] = [context, time.time()]
+
+    def end(self, session_id):
+        with self.lock:
+            self.sessions.pop(session_id, None)
+
+    def expire(self, now):
+        # Caller holds self.lock
+        for session_id in [s for s, entry in self.sessions.items() if now - entry[1] > self.ttl]:
+            del self.sessions[session_id]
+        while len(self.sessions) >= self.max_sessions:
+            oldest = min(self.sessions, key=lambda s: self.sessions[s][1])
+            del self.sessions[oldest]
+
+    def __len__(self):
+        return len(self.sessions)
+
+
+class ModelWorker:
+    """
+    Runs every session's requests through the model one at a time on a single thread.
+
+    llama-cpp can only generate one reply at a time per model, so requests wait in
+    a bounded queue. When MAX_PENDING_REQUESTS are already waiting, submit raises
+    queue.Full and the server can answer 503 instead of piling up work it cannot
+    finish in time.
+    """
+
+    def __init__(self, llama_model, sessions, max_pending=MAX_PENDING_REQUESTS):
+        self.llama_model = llama_model
+        self.sessions = sessions
+        self.jobs = queue.Queue(maxsize=max_pending)
+        self.thread = threading.Thread(target=self.run, name="model-worker", daemon=True)
+        self.thread.start()
+
+    def submit(self, session_id, prompt, on_token=None, on_function=None, cancelled=None):
+        """
+        Queue a prompt for a session.
+
+        A request whose cancelled event is set before the worker reaches it is
+        skipped; once running, it can only be stopped by its on_token raising.
+
+        Returns:
+            Future: Resolves to (response, function).
+
+        Raises:
+            queue.Full: Too many requests are already waiting.
+        """
+        future = concurrent.futures.Future()
+        self.jobs.put_nowait((session_id, prompt, on_token, on_function, cancelled, future))
+        return future
+
+    def pending(self):
+        return self.jobs.qsize()
+
+    def run(self):
+        while True:
+            session_id, prompt, on_token, on_function, cancelled, future = self.jobs.get()
+            try:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                if cancelled is not None and cancelled.is_set():
+                    # The client gave up while this was queued
+                    future.set_exception(TimeoutError("Request cancelled"))
+                    continue
+                context = self.sessions.get(session_id)
+                response, function, context = LLM_answer(prompt, context, self.llama_model, on_token, on_function)
+                self.sessions.update(session_id, context)
+                future.set_result((response, function))
+            except Exception as e:
+                print("Error generating response: " + str(e))
+                future.set_exception(e)
+            finally:
+                self.jobs.task_done()
@@ -0,0 +1,82 @@
+""" Speculative Engine: Script for the draft models that let the LLM accept several tokens per step."""
+
+import numpy as np
+from llama_cpp import Llama
+
+try:
+    from llama_cpp.llama_speculative import LlamaDraftModel, LlamaPromptLookupDecoding
+except ImportError:  # llama-cpp-python before 0.2.56 has no speculative decoding
+    LlamaDraftModel = object
+    LlamaPromptLookupDecoding = None
+
+
+class SmallModelDraft(LlamaDraftModel):
+    """
+    Draft tokens guessed greedily by a small model that shares the main model's vocabulary.
+
+    llama-cpp evaluates the guesses in one batch with the main model and keeps
+    only those it would have produced itself, so the output is unchanged and
+    every accepted guess saves a full step of the large model. The draft model
+    keeps its own cache, so each call only evaluates the tokens added since the
+    last one. Any error makes it return no guesses, which is plain decoding.
+    """
+
+    def __init__(self, model_path, num_pred_tokens=4, n_ctx=2048, n_threads=None):
+        self.num_pred_tokens = num_pred_tokens
+        self.model = Llama(model_path=model_path, n_ctx=n_ctx, n_threads=n_threads, verbose=False)
+        self.failed = False
+
+    def __call__(self, input_ids, /, **kwargs):
+        if self.failed:
+            return np.array([], dtype=np.intc)
+        guesses = []
+        try:
+            # generate() reuses the longest prefix already in this model's cache
+            for token in self.model.generate(list(input_ids), top_k=1, temp=0.0):
+                if token == self.model.token_eos():
+                    break
+                guesses.append(token)
+                if len(guesses) >= self.num_pred_tokens:
+                    break
+        except Exception as e:
+            print("Draft model failed, generating without it: " + str(e))
+            self.failed = True
+            guesses = []
+        return np.array(guesses, dtype=np.intc)
+
+
+def create_draft_model(config):
+    """
+    Draft model for the "draft" entry of a model config, or None to decode normally.
+
+    {"type": "prompt_lookup", "num_pred_tokens": 2} guesses by finding the last few
+    tokens earlier in the prompt, which suits the repeated "@Response:" and
+    "#Function:" patterns of the few-shot prompt and costs no extra model.
+    {"type": "model", "path": ..., "num_pred_tokens": 4} guesses with a small model.
+    Either makes llama-cpp keep logits for the whole context (n_ctx x n_vocab floats),
+    so models.json ships without a draft; see the README before turning one on.
+    """
+    draft = config.get("draft")
+    if not draft:
+        return None
+    try:
+        if LlamaPromptLookupDecoding is None:
+            raise RuntimeError("this llama-cpp-python has no speculative decoding")
+        if draft["type"] == "prompt_lookup":
+            return LlamaPromptLookupDecoding(num_pred_tokens=draft.get("num_pred_tokens", 2),
+                                             max_ngram_size=draft.get("max_ngram_size", 2))
+        if draft["type"] == "model":
+            return SmallModelDraft(draft["path"], draft.get("num_pred_tokens", 4), config["n_ctx"],
+                                   config.get("n_threads"))
+        raise ValueError("unknown draft type " + str(draft["type"]))
+    except Exception as e:
+        print("Speculative decoding unavailable, generating without it: " + str(e))
+        return None
+
+
+def check_draft_model(llm_model):
+    """Turn speculative decoding off if the draft model cannot produce the main model's tokens."""
+    draft = getattr(llm_model, "draft_model", None)
+    if isinstance(draft, SmallModelDraft) and draft.model.n_vocab() != llm_model.n_vocab():
+        print("Draft model vocabulary does not match the main model, generating without it")
+        llm_model.draft_model = None
@@ -0,0 +1,85 @@
+// Sends typed commands to /stream and shows the reply as it is generated
+
+const responseArea = document.getElementById("response-area");
+const inputField = document.getElementById("input-field");
+
+function addBubble(text) {
+    const bubble = document.createElement("p");
+    bubble.textContent = text;
+    responseArea.appendChild(bubble);
+    responseArea.scrollTop = responseArea.scrollHeight;
+    return bubble;
+}
+
+// The model writes "@Response: ... #Function:name(args)"; show only the response part
+function visibleText(raw) {
+    return raw.split("#")[0].replace(/^\s*@[^:]*:/, "").trim();
+}
+
+function parseEvent(block) {
+    let event = "message";
+    let data = "";
+    for (const line of block.split("\n")) {
+        if (line.startsWith("event: ")) {
+            event = line.slice(7);
+        } else if (line.startsWith("data: ")) {
+            data += line.slice(6);
+        }
+    }
+    return data ? {event: event, data: JSON.parse(data)} : null;
+}
+
+async function sendCommand(command) {
+    addBubble("You: " + command);
+    const bubble = addBubble("Cyclops: ...");
+    let raw = "";
+
+    try {
+        const reply = await fetch("/stream", {
+            method: "POST",
+            headers: {"Content-Type": "application/json"},
+            body: JSON.stringify({command: command}),
+        });
+        if (!reply.ok || !reply.body) {
+            const body = await reply.json();
+            bubble.textContent = "Cyclops: " + body.response;
+            return;
+        }
+
+        const reader = reply.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = "";
+        while (true) {
+            const {value, done} = await reader.read();
+            if (done) {
+                break;
+            }
+            buffer += decoder.decode(value, {stream: true});
+            let end;
+            while ((end = buffer.indexOf("\n\n")) >= 0) {
+                const message = parseEvent(buffer.slice(0, end));
+                buffer = buffer.slice(end + 2);
+                if (!message) {
+                    continue;  // Keep-alive comment
+                }
+                if (message.event === "token") {
+                    raw += message.data.text;
+                    bubble.textContent = "Cyclops: " + visibleText(raw);
+                } else if (message.event === "done" || message.event === "error") {
+                    bubble.textContent = "Cyclops: " + message.data.response.trim();
+                }
+                responseArea.scrollTop = responseArea.scrollHeight;
+            }
+        }
+    } catch (error) {
+        bubble.textContent = "Cyclops: Sorry, I could not reach the server.";
+    }
+}
+
+inputField.addEventListener("keydown", (event) => {
+    const command = inputField.value.trim();
+    if (event.key === "Enter" && command) {
+        inputField.value = "";
+        sendCommand(command);
+    }
+});
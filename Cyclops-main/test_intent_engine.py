@@ -0,0 +1,38 @@
+""" Tests for which commands the intent classifier answers locally and which it leaves for the LLM."""
+
+import os
+import unittest
+
+from intent_engine import IntentClassifier
+
+classifier = IntentClassifier(os.path.join(os.path.dirname(os.path.abspath(__file__)), "intents.json"))
+
+
+def route(command):
+    match = classifier.classify(command)
+    return match.name if match else None
+
+
+class IntentRoutingTest(unittest.TestCase):
+
+    def test_routine_commands(self):
+        for command, intent in [("what time is it", "time"), ("what is the time", "time"),
+                                ("what is the date today", "date"), ("what's the room temperature", "temperature"),
+                                ("what's the temperature in here", "temperature"), ("how do i look", "check_appearance"),
+                                ("do i look good today", "check_appearance"), ("take a photo", "take_photo"),
+                                ("set a timer for 5 minutes", "timer"), ("play some jazz", "play_music")]:
+            self.assertEqual(route(command), intent, command)
+
+    def test_somewhere_else_goes_to_llm(self):
+        for command in ["what is the temperature on mars", "what's the temperature in sydney",
+                        "what is the temperature of the moon", "how cold is it in canada",
+                        "what time is it in tokyo", "what time is it in london right now"]:
+            self.assertIsNone(route(command), command)
+
+    def test_statements_about_looks_go_to_llm(self):
+        for command in ["i look sad", "i look tired", "i look happy today"]:
+            self.assertIsNone(route(command), command)
+
+
+if __name__ == '__main__':
+    unittest.main()
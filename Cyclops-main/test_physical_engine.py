@@ -0,0 +1,50 @@
+""" Tests for the order in which queued Arduino commands are sent."""
+
+import unittest
+
+from physical_engine import CommandQueue, PRIORITY_HIGH, PRIORITY_NORMAL
+
+
+def drain(queue):
+    sent = []
+    while queue.depth():
+        cmd, _ = queue.get()
+        queue.task_done()
+        sent.append(cmd)
+    return sent
+
+
+def queue_of(*commands):
+    queue = CommandQueue()
+    for cmd in commands:
+        queue.put(cmd, 1, PRIORITY_NORMAL)
+    return queue
+
+
+class CommandQueueOrderTest(unittest.TestCase):
+
+    def test_lcd_text_after_animation(self):
+        # Ui.play_genre: the text must replace the sine wave, not the other way round
+        self.assertEqual(drain(queue_of("sine", "#Now Playing: jazz music")), ["sine", "#Now Playing: jazz music"])
+
+    def test_shutdown_sequence(self):
+        self.assertEqual(drain(queue_of("sad", "angry", "shutdown")), ["sad", "angry", "shutdown"])
+
+    def test_states_keep_text_between_them(self):
+        self.assertEqual(drain(queue_of("logo", "#Hello", "idle")), ["logo", "#Hello", "idle"])
+
+    def test_repeated_command_collapses(self):
+        self.assertEqual(drain(queue_of("idle", "idle", "sad", "angry", "sad")), ["idle", "sad", "angry", "sad"])
+
+    def test_servo_moves_collapse_only_back_to_back(self):
+        self.assertEqual(drain(queue_of("@90", "@120", "@150")), ["@150"])
+        self.assertEqual(drain(queue_of("@90", "#Hi", "@120")), ["@90", "#Hi", "@120"])
+
+    def test_explicit_priority_jumps_ahead(self):
+        queue = queue_of("sine", "#Now Playing")
+        queue.put("motion_off", 1, PRIORITY_HIGH)
+        self.assertEqual(drain(queue), ["motion_off", "sine", "#Now Playing"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,23 @@
+""" Tests for the sentence splitting used to speak LLM replies while they stream in."""
+
+import unittest
+
+from voice_engine import ends_with_abbreviation
+
+
+class EndsWithAbbreviationTest(unittest.TestCase):
+
+    def test_abbreviations(self):
+        for sentence in ["Ask Dr.", "I met Mrs.", "Fruit, e.g.", "Cats vs.", "Paper, pens etc.", "(St."]:
+            self.assertTrue(ends_with_abbreviation(sentence), sentence)
+
+    def test_words_ending_like_abbreviations(self):
+        for sentence in ["You are the best.", "I came first.", "No problems.", "Look at the items.", "Hmm."]:
+            self.assertFalse(ends_with_abbreviation(sentence), sentence)
+
+    def test_empty(self):
+        self.assertFalse(ends_with_abbreviation(""))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,23 +1,450 @@
-""" Voice Engine: A Script for text to speech using Windows Voices."""
+""" Voice Engine: A Script for text to speech using the system voices (SAPI5 on Windows, eSpeak on Linux)."""
+
+import collections
+import concurrent.futures
+import hashlib
+import heapq
+import itertools
+import os
+import sys
+import threading
+import time
 
 import pyttsx3
+from pygame import mixer
+
+# pyttsx3 driver for this platform
+if sys.platform == 'win32':
+    TTS_DRIVER = 'sapi5'
+elif sys.platform == 'darwin':
+    TTS_DRIVER = 'nsss'
+else:
+    TTS_DRIVER = 'espeak'
+
+VOICE_INDEX = 1  # change the index if you are facing any problem with the voice
+VOLUME = 1.0  # Volume (0.0 to 1.0)
+RATE = 175  # Speech rate (words per minute)
+
+CACHE_DIR = "tts_cache"  # Pre-rendered WAV files, named by a hash of the text and voice settings
+CACHE_MAX_FILES = 200  # Least recently played files are deleted beyond this
+CACHE_MAX_CHARS = 80  # Only short phrases are worth caching
+REPEAT_THRESHOLD = 2  # Cache other short texts once they have been spoken this many times
+MAX_TRACKED_PHRASES = 500  # Texts spoken once that are remembered; the least recently spoken are forgotten
+RENDER_IDLE_DELAY = 3  # Seconds without speech before the cache is filled, so rendering rarely delays a reply
+
+# Phrases the assistant says all the time, rendered to the cache while the speech thread is idle
+CACHED_PHRASES = [
+    "Yes I am here.",
+    "Let me think",
+    "You want to say anything else",
+    "Timer stopped",
+    "Music stopped",
+    "Ok got it",
+    "Initializing LLM Engine",
+    "Initializing Listener Engine",
+    "Initializing Visual Engine",
+    "No hardware detected. Check connections.",
+    "Check the screen on my body",
+    "Sorry your command is not understandable.",
+]
+
+PRIORITY_HIGH = 0  # Alerts and answers to the latest command, interrupts lower priority speech
+PRIORITY_NORMAL = 1  # Chat responses
+PRIORITY_LOW = 2  # Background chatter such as news headlines
+
+ABBREVIATIONS = ("dr.", "mr.", "mrs.", "ms.", "st.", "e.g.", "i.e.", "vs.", "etc.")  # Periods that end no sentence
+
+
+class PhraseCache:
+    """
+    On-disk cache of synthesized phrases, played back through the pygame mixer.
+
+    Files are named by a hash of the text and the voice settings, so changing the
+    voice or rate never plays stale audio. Playing a file refreshes its timestamp
+    and the least recently played files are evicted beyond CACHE_MAX_FILES.
+    """
+
+    def __init__(self, directory=CACHE_DIR, driver=TTS_DRIVER):
+        self.directory = directory
+        self.driver = driver
+        self.counts = collections.OrderedDict()  # text -> times spoken live, least recently spoken first
+        self.to_render = list(CACHED_PHRASES)
+
+    def path_for(self, text):
+        key = "|".join([self.driver, str(VOICE_INDEX), str(RATE), str(VOLUME), text])
+        return os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest() + ".wav")
+
+    def lookup(self, text):
+        """Return the cached WAV path for text, or None."""
+        path = self.path_for(text)
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            os.utime(path)  # Mark as recently used
+            return path
+        return None
+
+    def note_spoken(self, text):
+        # Remember texts spoken live so repeated ones get rendered while idle
+        if len(text) > CACHE_MAX_CHARS:
+            return
+        count = self.counts.pop(text, 0) + 1
+        if count >= REPEAT_THRESHOLD:
+            if text not in self.to_render:
+                self.to_render.append(text)
+            return
+        self.counts[text] = count
+        if len(self.counts) > MAX_TRACKED_PHRASES:
+            self.counts.popitem(last=False)
+
+    def next_to_render(self):
+        while self.to_render:
+            text = self.to_render.pop(0)
+            if self.lookup(text) is None:
+                return text
+        return None
+
+    def render(self, engine, text, interrupted=lambda: False):
+        """
+        Synthesize text to the cache with the given pyttsx3 engine (on the speech thread).
+
+        The audio is written to a temporary file and only moved into place if
+        interrupted() is still False afterwards, so a render cut short never
+        leaves a truncated phrase to be played.
+
+        Returns:
+            bool: Whether the phrase was cached.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path_for(text)
+        partial = path[:-len(".wav")] + ".part.wav"
+        engine.save_to_file(text, partial)
+        engine.runAndWait()
+        if interrupted() or not os.path.exists(partial):
+            if os.path.exists(partial):
+                os.remove(partial)
+            return False
+        os.replace(partial, path)
+        self.evict()
+        return True
+
+    def evict(self):
+        files = [os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith(".wav")]
+        if len(files) <= CACHE_MAX_FILES:
+            return
+        files.sort(key=os.path.getmtime)
+        for path in files[:len(files) - CACHE_MAX_FILES]:
+            try:
+                os.remove(path)
+            except OSError as e:
+                print(e)
+
+
+def mixer_ready():
+    # The listener and timer engines initialize the mixer; do it here too if they have not
+    if mixer.get_init():
+        return True
+    try:
+        mixer.init()
+        return True
+    except Exception as e:
+        print("Mixer unavailable, phrase cache disabled: " + str(e))
+        return False
+
+
+class SpeechEngine:
+    """
+    Single text-to-speech engine owned by a dedicated speech thread.
+
+    pyttsx3 is initialised and configured once, on the thread that runs it, instead
+    of on every utterance. Other threads submit text to a priority queue and get a
+    concurrent.futures.Future back (wrap it with asyncio.wrap_future to await it).
+
+    Identical text that is already queued or being spoken is not queued twice. A
+    request with a higher priority than the utterance being spoken cuts it off
+    (barge-in), and interrupt=True also drops everything of the same or lower
+    priority that is still waiting.
+
+    Phrases found in the PhraseCache are played from disk instead of being
+    synthesized. Missing ones are rendered once nothing has been spoken for
+    RENDER_IDLE_DELAY seconds, and a request arriving during a render stops it
+    like a barge-in; the phrase is rendered again at the next quiet spell.
+    """
+
+    def __init__(self, driver=TTS_DRIVER):
+        self.driver = driver
+        self.pending = []  # heap of (priority, order, text, future)
+        self.order = itertools.count()
+        self.condition = threading.Condition()
+        self.current = None  # (priority, text, future) being spoken
+        self.cancel_current = False
+        self.rendering = False  # Filling the phrase cache with the engine
+        self.last_spoken = 0.0  # When the last utterance finished
+        self.engine = None
+        self.thread = None
+        self.cache = PhraseCache(driver=driver)
+
+    def start(self):
+        with self.condition:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name="speech", daemon=True)
+                self.thread.start()
+
+    def create_engine(self):
+        # Initialize the text-to-speech engine
+        engine = pyttsx3.init(self.driver)
+
+        # Set the voice, falling back to the default one if there are fewer voices installed
+        voices = engine.getProperty('voices')
+        if voices:
+            engine.setProperty('voice', voices[min(VOICE_INDEX, len(voices) - 1)].id)
+
+        engine.setProperty('volume', VOLUME)
+        engine.setProperty('rate', RATE)
+
+        # Stopping from inside the engine's own callback is the thread-safe way to cut speech short
+        engine.connect('started-word', self.on_word)
+        return engine
+
+    def on_word(self, name, location, length):
+        if self.cancel_current:
+            self.engine.stop()
+
+    def run(self):
+        try:
+            self.engine = self.create_engine()
+        except Exception as e:
+            print("Error initializing speech engine: " + str(e))
+
+        while True:
+            with self.condition:
+                while not self.pending:
+                    # Use idle time to fill the phrase cache
+                    quiet = time.time() - self.last_spoken
+                    if self.engine is not None and self.cache.to_render and quiet < RENDER_IDLE_DELAY:
+                        self.condition.wait(RENDER_IDLE_DELAY - quiet)
+                        continue
+                    text = self.cache.next_to_render() if self.engine is not None else None
+                    if text is None:
+                        self.condition.wait()
+                        continue
+                    self.rendering = True
+                    self.cancel_current = False
+                    self.condition.release()
+                    try:
+                        self.cache.render(self.engine, text, lambda: self.cancel_current)
+                    except Exception as e:
+                        print("Error rendering phrase to cache: " + str(e))
+                    finally:
+                        self.condition.acquire()
+                        if self.cancel_current:
+                            # Cut short by a request; render it again at the next quiet spell
+                            self.cache.to_render.insert(0, text)
+                        self.rendering = False
+                        self.cancel_current = False
+                priority, _, text, future = heapq.heappop(self.pending)
+                self.current = (priority, text, future)
+                self.cancel_current = False
+
+            spoken = False
+            try:
+                if future.set_running_or_notify_cancel():
+                    cached = self.cache.lookup(text)
+                    if cached is not None and self.play_cached(cached):
+                        spoken = True
+                    elif self.engine is not None:
+                        # Speak the provided text and wait for the speech to finish
+                        self.engine.say(text)
+                        self.engine.runAndWait()
+                        self.cache.note_spoken(text)
+                        spoken = True
+            except Exception as e:
+                print("Error in speech engine: " + str(e))
+            finally:
+                with self.condition:
+                    interrupted = self.cancel_current
+                    self.current = None
+                    self.cancel_current = False
+                    self.last_spoken = time.time()
+                if not future.done():
+                    future.set_result(spoken and not interrupted)
+
+    def play_cached(self, path):
+        """Play a cached WAV file, returning False if the mixer cannot play it."""
+        if not mixer_ready():
+            return False
+        try:
+            channel = mixer.Sound(path).play()
+        except Exception as e:
+            print("Error playing cached phrase: " + str(e))
+            return False
+        if channel is None:
+            return False
+
+        # Poll so a barge-in can stop the file like it stops live speech
+        while channel.get_busy():
+            if self.cancel_current:
+                channel.stop()
+                break
+            time.sleep(0.02)
+        return True
+
+    def say(self, text, priority=PRIORITY_NORMAL, interrupt=False):
+        """
+        Queue text to be spoken.
+
+        Args:
+            text (str): Text to speak.
+            priority (int): PRIORITY_HIGH, PRIORITY_NORMAL or PRIORITY_LOW.
+            interrupt (bool): Stop the current utterance and drop queued ones of the same or lower priority.
+
+        Returns:
+            Future: Resolves to True once spoken, False if it was interrupted or dropped.
+        """
+        self.start()
+        text = text.strip()
+        with self.condition:
+            # De-duplicate against what is being spoken and what is waiting
+            if not interrupt:
+                if self.current is not None and self.current[1] == text and not self.cancel_current:
+                    return self.current[2]
+                for queued in self.pending:
+                    if queued[2] == text:
+                        return queued[3]
+
+            if self.current is not None and (interrupt or priority < self.current[0]):
+                self.cancel_current = True
+            if self.rendering:
+                # Stop filling the cache so this is spoken straight away
+                self.cancel_current = True
+            if interrupt:
+                self.drop_pending(lambda queued: queued[0] >= priority)
+
+            future = concurrent.futures.Future()
+            heapq.heappush(self.pending, (priority, next(self.order), text, future))
+            self.condition.notify()
+            return future
+
+    def drop_pending(self, predicate):
+        # Caller holds self.condition
+        kept = []
+        for queued in self.pending:
+            if predicate(queued):
+                if not queued[3].done():
+                    queued[3].set_result(False)
+            else:
+                kept.append(queued)
+        heapq.heapify(kept)
+        self.pending = kept
+
+    def stop(self):
+        """Cut off the current utterance and drop everything still queued."""
+        with self.condition:
+            self.drop_pending(lambda queued: True)
+            if self.current is not None:
+                self.cancel_current = True
+
+
+speech_engine = SpeechEngine()
+
+
+def speak(text, priority=PRIORITY_NORMAL):
+    # Speak the provided text on the speech thread and wait for it to finish
+    speech_engine.say(text, priority).result()
+
+
+def speak_async(text, priority=PRIORITY_NORMAL, interrupt=False):
+    """
+    Speak text without blocking the caller.
+
+    Returns:
+        Future: Resolves to True once spoken, False if it was interrupted or dropped.
+    """
+    return speech_engine.say(text, priority, interrupt)
+
+
+def stop_speaking():
+    """Stop the current utterance and clear the speech queue."""
+    speech_engine.stop()
+
+
+def is_speaking():
+    """Whether the speech thread is saying something right now."""
+    return speech_engine.current is not None
+
+
+def ends_with_abbreviation(sentence):
+    """Whether the last word of sentence is an abbreviation such as "Dr." rather than a sentence end."""
+    words = sentence.split()
+    return bool(words) and words[-1].lower().lstrip("(\"'") in ABBREVIATIONS
+
+
+class SentenceSpeaker:
+    """
+    Speaks an LLM reply sentence by sentence while it is still being generated.
+
+    Feed it the raw generated text as it streams in ("@Response: ... #Function:...");
+    it skips the "@Response:" tag, stops at the "#Function" marker and queues each
+    completed sentence on the speech thread.
+    """
+
+    def __init__(self, priority=PRIORITY_NORMAL):
+        self.priority = priority
+        self.raw = ""  # Everything fed so far
+        self.pending = ""  # Response text not yet spoken
+        self.started = False  # Past the "@Response:" tag
+        self.finished = False  # Reached the "#Function" marker
+        self.futures = []
 
+    def feed(self, text):
+        if self.finished:
+            return
+        self.raw += text
 
-def speak(text):
-    # Initialize the text-to-speech engine
-    engine = pyttsx3.init('sapi5')
+        if not self.started:
+            tag = self.raw.find('@')
+            colon = self.raw.find(':', tag) if tag >= 0 else -1
+            if colon >= 0:
+                text = self.raw[colon + 1:]
+            elif tag < 0 and len(self.raw) > 20:
+                text = self.raw  # The model skipped the tag, treat it all as the response
+            else:
+                return
+            self.started = True
 
-    # Set the voice (using the third voice in this case)
-    engine.setProperty('voice', engine.getProperty('voices')[1].id) # change the id if you are facing any problem.
+        if '#' in text:
+            text = text[:text.find('#')]
+            self.finished = True
+        self.pending += text
+        self.flush_sentences()
+        if self.finished:
+            self.finish()
 
-    # Set the volume (0.0 to 1.0)
-    engine.setProperty('volume', 1.0)
+    def flush_sentences(self):
+        # A sentence is complete once its end punctuation is followed by whitespace
+        start = 0
+        for i in range(len(self.pending) - 1):
+            if self.pending[i] in ".!?" and self.pending[i + 1].isspace():
+                sentence = self.pending[start:i + 1].strip()
+                if ends_with_abbreviation(sentence):
+                    continue
+                if sentence:
+                    self.futures.append(speak_async(sentence, self.priority))
+                start = i + 1
+        self.pending = self.pending[start:]
 
-    # Set the speech rate (words per minute)
-    engine.setProperty('rate', 175)
+    def finish(self):
+        """
+        Speak whatever is left after generation ends.
 
-    # Speak the provided text
-    engine.say(text)
+        Returns:
+            int: Number of utterances queued for this reply (0 if nothing streamed in).
+        """
+        rest = self.pending.strip()
+        self.pending = ""
+        if rest:
+            self.futures.append(speak_async(rest, self.priority))
+        return len(self.futures)
 
-    # Wait for the speech to finish
-    engine.runAndWait()
+    def wait(self):
+        """Block until every queued sentence has been spoken (or dropped)."""
+        for future in self.futures:
+            future.result()